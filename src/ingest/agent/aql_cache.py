@@ -0,0 +1,164 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import streamlit as st
+from langchain_community.chains.graph_qa.arangodb import ArangoGraphQAChain, ArangoGraph
+
+import database as db
+from agent.code_cache import normalize_query
+from agent.schema_store import SchemaStore
+
+AQL_CACHE_MAX_ENTRIES = 256
+
+
+def _revisions_of(aql: str):
+    """Revisions of every collection and named graph an AQL query mentions."""
+    collections, graphs = db.get_collection_and_graph_names()
+    mentioned = lambda name: re.search(rf"(?<![\w/]){re.escape(name)}(?![\w/])", aql) is not None
+    revisions = db.get_collection_revisions(tuple(c for c in collections if mentioned(c)))
+    return revisions + tuple((g, db.get_graph_revision(g)) for g in graphs if mentioned(g))
+
+
+class AQLCache:
+    """
+    Two-level cache of text_to_aql_to_text:
+    - question -> generated AQL, skipping the generation LLM call
+    - AQL + bind vars + revisions of the collections it reads -> result rows (and the
+      answer written from them), skipping the database query until those collections change
+
+    Both levels are bounded LRU dicts shared by every session of the process.
+    """
+
+    def __init__(self, max_entries: int = AQL_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.queries = OrderedDict()  # question key -> AQL
+        self.results = OrderedDict()  # result key -> rows
+        self.answers = OrderedDict()  # (question key, result key) -> answer
+        self.stats = {"aql_hits": 0, "aql_misses": 0, "result_hits": 0, "result_misses": 0}
+        self._lock = threading.Lock()
+
+    def _get(self, table: OrderedDict, key, stat: str = None):
+        with self._lock:
+            value = table.get(key)
+            if value is not None:
+                table.move_to_end(key)
+            if stat:
+                self.stats[f"{stat}_{'hits' if value is not None else 'misses'}"] += 1
+            return value
+
+    def _put(self, table: OrderedDict, key, value):
+        with self._lock:
+            table[key] = value
+            table.move_to_end(key)
+            while len(table) > self.max_entries:
+                table.popitem(last=False)
+
+    def get_aql(self, question_key):
+        return self._get(self.queries, question_key, "aql")
+
+    def put_aql(self, question_key, aql):
+        self._put(self.queries, question_key, aql)
+
+    def forget_aql(self, question_key):
+        with self._lock:
+            self.queries.pop(question_key, None)
+
+    @staticmethod
+    def result_key(aql: str, bind_vars: dict = None, top_k: int = None):
+        return (aql.strip(), json.dumps(bind_vars or {}, sort_keys=True, default=str), top_k, _revisions_of(aql))
+
+    def get_rows(self, result_key):
+        return self._get(self.results, result_key, "result")
+
+    def put_rows(self, result_key, rows):
+        self._put(self.results, result_key, rows)
+
+    def get_answer(self, question_key, result_key):
+        return self._get(self.answers, (question_key, result_key))
+
+    def put_answer(self, question_key, result_key, answer):
+        self._put(self.answers, (question_key, result_key), answer)
+
+
+class CachedArangoGraph(ArangoGraph):
+    """
+    ArangoGraph whose queries go through the result level of the AQLCache, and whose
+    schema is read from the SchemaStore instead of being sampled when it is built.
+    """
+
+    def __init__(self, adb, cache: AQLCache, schema_store: SchemaStore):
+        self.cache = cache
+        self.schema_store = schema_store
+        self._fixed_schema = None
+        super().__init__(adb)
+
+    def set_schema(self, schema=None):
+        # Without an explicit schema, the store's current one is used
+        self._fixed_schema = schema
+
+    @property
+    def schema(self):
+        return self._fixed_schema if self._fixed_schema is not None else self.schema_store.get()
+
+    def query(self, query: str, top_k: Optional[int] = None, **kwargs: Any):
+        key = self.cache.result_key(query, kwargs.get("bind_vars"), top_k)
+        rows = self.cache.get_rows(key)
+        if rows is None:
+            rows = super().query(query, top_k, **kwargs)
+            self.cache.put_rows(key, rows)
+        return rows
+
+
+class CachedArangoGraphQAChain(ArangoGraphQAChain):
+    """
+    ArangoGraphQAChain reusing the AQL generated for a question it has seen before,
+    and the answer written for the same rows. Falls back to the full chain (generation,
+    fix attempts, answer) on a miss or when the cached AQL stopped working.
+    """
+
+    def _call(self, inputs: Dict[str, Any], run_manager=None) -> Dict[str, Any]:
+        cache: AQLCache = self.graph.cache
+        question_key = normalize_query(inputs[self.input_key])
+
+        aql_query = cache.get_aql(question_key)
+        if aql_query is not None:
+            try:
+                aql_result = self.graph.query(aql_query, self.top_k)
+            except Exception as e:
+                print(f"Cached AQL failed, generating it again: {e}")
+                cache.forget_aql(question_key)
+            else:
+                return {self.output_key: self._answer(inputs, question_key, aql_query, aql_result, run_manager)}
+
+        # The parent returns its AQL and rows as well, so both can be cached
+        result = super()._call(inputs, run_manager)
+        cache.put_aql(question_key, result["aql_query"])
+        cache.put_answer(question_key, cache.result_key(result["aql_query"], None, self.top_k), result[self.output_key])
+        return {self.output_key: result[self.output_key]}
+
+    def _answer(self, inputs, question_key, aql_query, aql_result, run_manager):
+        cache: AQLCache = self.graph.cache
+        result_key = cache.result_key(aql_query, None, self.top_k)
+        answer = cache.get_answer(question_key, result_key)
+        if answer is None:
+            callbacks = run_manager.get_child() if run_manager else None
+            answer = self.qa_chain.invoke(
+                {
+                    "adb_schema": self.graph.schema,
+                    "user_input": inputs[self.input_key],
+                    "aql_query": aql_query,
+                    "aql_result": aql_result,
+                },
+                config={"callbacks": callbacks},
+            )[self.qa_chain.output_key]
+            cache.put_answer(question_key, result_key, answer)
+        print(f"AQL cache: {cache.stats}")
+        return answer
+
+
+@st.cache_resource
+def get_aql_cache():
+    return AQLCache()
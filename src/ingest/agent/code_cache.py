@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+# Local SQLite file holding the generated code that ran successfully
+CODE_CACHE_PATH = os.environ.get("NX_CODE_CACHE_PATH", ".nx_code_cache.sqlite")
+CODE_CACHE_MAX_ENTRIES = 500
+
+
+def normalize_query(text: str):
+    """Lowercase, collapse whitespace and drop trailing punctuation, so rephrasings of the same text share a key."""
+    return re.sub(r"\s+", " ", (text or "").lower()).strip().rstrip("?!. ")
+
+
+class CodeCache:
+    """
+    Content-addressed cache of LLM-generated NetworkX code.
+
+    Entries are keyed by a hash of the graph name, the graph schema and the normalized
+    question, and only code that already executed successfully is stored. The sources
+    are kept in SQLite so warm entries survive restarts, the sandbox workers compile
+    (and cache) the code they run. The least recently used entries are evicted above
+    `max_entries`.
+    """
+
+    def __init__(self, path: str = CODE_CACHE_PATH, max_entries: int = CODE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nx_code ("
+            "key TEXT PRIMARY KEY, graph_name TEXT, source TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(graph_name: str, schema: dict, query: str, context: str = "", other_instruction: str = ""):
+        payload = json.dumps(
+            [graph_name, schema, normalize_query(query), normalize_query(context), normalize_query(other_instruction)],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        """Return the source of a cached entry, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT source FROM nx_code WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE nx_code SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, source: str, graph_name: str = None):
+        """Store code that executed successfully."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO nx_code (key, graph_name, source, last_used) VALUES (?, ?, ?, ?)",
+                (key, graph_name, source, time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def discard(self, key: str):
+        """Forget an entry, e.g. cached code that stopped working on a changed graph."""
+        with self._lock:
+            self._conn.execute("DELETE FROM nx_code WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute(
+            "DELETE FROM nx_code WHERE key NOT IN (SELECT key FROM nx_code ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM nx_code").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": total,
+        }
+
+
+@st.cache_resource
+def get_code_cache():
+    return CodeCache()
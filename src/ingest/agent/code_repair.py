@@ -0,0 +1,113 @@
+import ast
+import re
+import time
+
+from agent import env
+from sandbox import SandboxError, SandboxTimeout, SandboxUnavailable
+
+repair_code_template = env.get_template("repair_code_prompt.jinja")
+
+
+class CodeRepairError(Exception):
+    """Generated code still failed after every repair attempt."""
+
+
+def clean_code(text: str):
+    """Strip the markdown code fences around generated code."""
+    return re.sub(r"^```(python|python3)?\n|```$", "", text, flags=re.MULTILINE).strip()
+
+
+def missing_outputs(code: str, required_outputs):
+    """
+    Statically check that `code` parses and assigns every required output variable.
+
+    Returns:
+        An error message, or None when the code looks runnable
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return f"SyntaxError: {e.msg}\n  line {e.lineno}: {(e.text or '').strip()}"
+
+    assigned = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            assigned.add(node.id)
+    missing = [name for name in required_outputs if name not in assigned]
+    if missing:
+        return f"The code never assigns {', '.join(missing)}"
+    return None
+
+
+def run_with_repair(llm, code: str, task_prompt: str, run, required_outputs=("FINAL_RESULT",), max_attempts: int = 3):
+    """
+    Run generated code, sending the error and the failing code back to the model for a
+    corrected version instead of re-running the same code.
+
+    Every attempt validates the code statically first, so code that cannot work is
+    repaired without being executed. A timeout ends the loop at once: a repaired
+    version of a too-slow algorithm is rarely faster. So does an unavailable sandbox,
+    which is not the code's fault.
+
+    Args:
+        llm: The chat model to ask for repairs
+        code: The generated code
+        task_prompt: The prompt the code was generated from
+        run: Callable executing code and returning its output variables (e.g. SandboxExecutor.run)
+        required_outputs: Variables the code must set
+        max_attempts: Maximum number of executions, repairs included
+
+    Returns:
+        (output variables, the code that ran, per-attempt metrics)
+
+    Raises:
+        SandboxTimeout: The code ran too long
+        SandboxUnavailable: The sandbox could not run the code (no free worker, missing snapshot)
+        CodeRepairError: The code still failed after the last attempt
+    """
+    metrics = []
+    for attempt in range(1, max_attempts + 1):
+        started = time.perf_counter()
+        error = missing_outputs(code, required_outputs)
+        stage = "validate"
+        if error is None:
+            stage = "execute"
+            try:
+                local_vars = run(code)
+                missing = [name for name in required_outputs if name not in local_vars]
+                if missing:
+                    error = f"The code ran but did not set {', '.join(missing)}"
+            except SandboxTimeout:
+                metrics.append({"attempt": attempt, "stage": stage, "seconds": time.perf_counter() - started, "error": "timeout"})
+                print(f"Attempt #{attempt}: timed out, metrics: {metrics}")
+                raise
+            except SandboxUnavailable as e:
+                metrics.append({"attempt": attempt, "stage": stage, "seconds": time.perf_counter() - started, "error": str(e)})
+                print(f"Attempt #{attempt}: sandbox unavailable, metrics: {metrics}")
+                raise
+            except Exception as e:
+                # Sandbox errors already name the exception and the failing lines
+                error = str(e) if isinstance(e, SandboxError) else f"{type(e).__name__}: {e}"
+
+        metrics.append({"attempt": attempt, "stage": stage, "seconds": time.perf_counter() - started, "error": error})
+        print(f"Attempt #{attempt}: {stage} {'ok' if error is None else 'failed'} in {metrics[-1]['seconds']:.2f}s")
+        if error is None:
+            return local_vars, code, metrics
+
+        print(f"EXEC ERROR: {error}")
+        if attempt == max_attempts:
+            break
+
+        started = time.perf_counter()
+        code = clean_code(llm.invoke(repair_code_template.render({
+            "task_prompt": task_prompt,
+            "code": code,
+            "error": error,
+            "required_outputs": required_outputs,
+        })).content)
+        metrics.append({"attempt": attempt, "stage": "repair", "seconds": time.perf_counter() - started, "error": None})
+        print('-'*10)
+        print(code)
+        print('-'*10)
+
+    raise CodeRepairError(metrics[-1]["error"])
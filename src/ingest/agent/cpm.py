@@ -3,81 +3,88 @@ import networkx as nx
 import os
 os.environ["NETWORKX_FALLBACK_TO_NX"] = "True"
 
+import numpy as np
 import pandas as pd
 import re
+from typing import Optional
 
-from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
-from arango import ArangoClient
-from langchain_openai import ChatOpenAI
 
-
-db = ArangoClient(hosts="https://b61c3b83bfe6.arangodb.cloud:8529") \
-    .db(username="root", 
-        password="RHr0KzkRUVlp61IisH8G", 
-        name="DAC_devops_log",
-        verify=True)
-
-model = ChatOpenAI(model="gpt-4o", temperature=0.7, api_key=st.secrets["OPENAI_API_KEY"])
+from agent.cpm_engine import TaskDAG, get_schedule, pert_bounds, simulate_pert
+from clients import get_llm
+from graph_hash import node_attribute
+from sandbox import get_sandbox
 
 
 @tool    
-def create_cpm_table(G_adb):
+def create_cpm_table(G_adb, changed_tasks: Optional[list[str]] = None):
     """
     Create a dataframe from the Critical Path Method (CPM) analysis of our graph.
 
     Args:
         G_adb: The ArangoDB graph object
+        changed_tasks: Optional list of TaskIDs whose story points or status changed since the last CPM table
+            of this graph. Only the tasks whose story points changed and the tasks around them are recomputed.
 
     Returns:
         A pandas DataFrame with the CPM analysis results
     """
 
-    for node in G_adb.nodes():
-        story_points = G_adb.nodes[node].get("StoryPoints", "1")  # Default to 1 if missing
-        G_adb.nodes[node]["duration"] = int(story_points)  # Ensure integer conversion
-
-    # Step 1: Compute earliest start (ES) and finish (EF)
-    es = {}  # Earliest Start
-    ef = {}  # Earliest Finish
-
-    for node in nx.topological_sort(G_adb, backend="networkx"):
-        es[node] = max((ef.get(pred, 0) for pred in G_adb.predecessors(node)), default=0)
-        ef[node] = es[node] + G_adb.nodes[node]["duration"]
-
-    # Step 2: Compute latest finish (LF) and start (LS)
-    lf = {}  # Latest Finish
-    ls = {}  # Latest Start
-
-    # Start from the last node in the topological order
-    project_duration = max(ef.values())  # Total project duration
-    for node in reversed(list(nx.topological_sort(G_adb))):
-        lf[node] = min((ls.get(succ, project_duration) for succ in G_adb.successors(node)), default=project_duration)
-        ls[node] = lf[node] - G_adb.nodes[node]["duration"]
-
-    # Step 3: Compute slack time
-    slack = {node: ls[node] - es[node] for node in G_adb.nodes()}
-
-    slack_score = pd.DataFrame(list(slack.items()), columns=['TaskID', 'slack_time'])
-    slack_score['TaskID'] = slack_score['TaskID'].str.replace('task/', '')
-    slack_score = slack_score.sort_values(by='slack_time', ascending=False)
-    # slack_score.head(10)
-    es_score = pd.DataFrame(list(es.items()), columns=['TaskID', 'earliest_start'])
-    es_score['TaskID'] = es_score['TaskID'].str.replace('task/', '')
-    es_score = es_score.sort_values(by='earliest_start', ascending=False)
-    # es_score.head(10)
-    ls_score = pd.DataFrame(list(ls.items()), columns=['TaskID', 'latest_start'])
-    ls_score['TaskID'] = ls_score['TaskID'].str.replace('task/', '')
-    ls_score = ls_score.sort_values(by='latest_start', ascending=False)
-    # ls_score.head(10)
-
-    merged_df = es_score.merge(slack_score, on='TaskID', how='outer')\
-                           .merge(ls_score, on='TaskID', how='outer')
+    # Convert the graph once into CSR arrays, the source graph is left untouched.
+    # Re-asks on the same graph only re-propagate the changed tasks.
+    schedule = get_schedule(G_adb, changed_tasks)
+    dag = schedule.dag
+
+    task_ids = pd.Series(dag.nodes, dtype=str).str.replace('task/', '')
+    merged_df = pd.DataFrame({
+        'TaskID': task_ids,
+        'earliest_start': schedule.es,
+        'slack_time': schedule.slack,
+        'latest_start': schedule.ls,
+    })
 
     merged_df = merged_df.sort_values(by=['latest_start', 'slack_time'], ascending=[True, True])
 
     return merged_df
 
+@tool
+def create_pert_table(G_adb, trials: int = 10000, distribution: str = "triangular"):
+    """
+    Create a dataframe from a Monte Carlo PERT simulation of our task graph.
+
+    Instead of treating StoryPoints as a fixed duration, every task duration is sampled around its
+    StoryPoints and its planned window (EstimatedFinishTime - StartTime) for many simulated projects.
+
+    Args:
+        G_adb: The ArangoDB graph object
+        trials: Number of simulated projects (default: 10000)
+        distribution: 'triangular' (default) or 'beta'
+
+    Returns:
+        A pandas DataFrame with, per task, the probability of being on the critical path, and the
+        percentiles of project completion time in `df.attrs["project_completion_percentiles"]`
+    """
+    dag = TaskDAG.from_graph(G_adb)
+
+    start = pd.to_datetime(pd.Series(node_attribute(G_adb, dag.nodes, "StartTime")), errors="coerce")
+    finish = pd.to_datetime(pd.Series(node_attribute(G_adb, dag.nodes, "EstimatedFinishTime")), errors="coerce")
+    window = (finish - start).dt.days.to_numpy(dtype=float, na_value=np.nan)
+
+    low, mode, high = pert_bounds(dag.duration, window)
+    result = simulate_pert(dag, low, mode, high, trials=trials, distribution=distribution)
+
+    pert_df = pd.DataFrame({
+        'TaskID': pd.Series(dag.nodes, dtype=str).str.replace('task/', ''),
+        'criticality_probability': result.criticality,
+        'expected_duration': result.mean_duration,
+        'expected_finish': result.mean_finish,
+    })
+    pert_df = pert_df.sort_values(by=['criticality_probability', 'expected_finish'], ascending=[False, True])
+    pert_df = pert_df.reset_index(drop=True)
+    pert_df.attrs["project_completion_percentiles"] = result.completion_percentiles()
+
+    return pert_df
+
 @tool
 def ask_cpm_question(question, df, model_name="gpt-4o"):
     """
@@ -95,7 +102,7 @@ def ask_cpm_question(question, df, model_name="gpt-4o"):
     Returns:
         Answer from ChatGPT about the dataframe
     """
-    llm = ChatOpenAI(temperature=0, model_name=model_name, api_key=st.secrets["OPENAI_API_KEY"])
+    llm = get_llm(temperature=0, model_name=model_name)
     
     # Get dataframe info
     df_info = df.info(buf=None, max_cols=None, memory_usage=None, show_counts=None)
@@ -138,11 +145,8 @@ def ask_cpm_question(question, df, model_name="gpt-4o"):
     print('-'*10)
 
     print("\n2) Executing python code")
-    global_vars = {"df": df}
-    local_vars = {}
-
     try:
-        exec(text_to_python_cleaned, global_vars, local_vars)
+        local_vars = get_sandbox().run(text_to_python_cleaned, inputs={"df": df})
         text_to_python_final = text_to_python
     except Exception as e:
         print(f"EXEC ERROR: {e}")
@@ -1,15 +1,24 @@
 import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+from itertools import islice
 import streamlit as st
-from typing import Any
-from langchain_openai import ChatOpenAI
-import nx_arangodb as nxadb
+from typing import TYPE_CHECKING, Any
 
 from langchain_core.tools import tool
 from arango.database import StandardDatabase
 from agent import env
+from graph_store import load_shared_graph
+from clients import get_llm
+from database import TASKS_TO_PROJECT_MAP
 
 import pandas as pd
 
+if TYPE_CHECKING:
+    import nx_arangodb as nxadb
+
 
 NODE_SCHEMA = {
     "employee": {
@@ -58,9 +67,37 @@ EDGE_SCHEMA = {
     }
 }
 
+# Rough per-element overhead of a NetworkX graph (adjacency dict entries + attribute dict)
+NODE_OVERHEAD_BYTES = 400
+EDGE_OVERHEAD_BYTES = 250
+
+# Default memory budget of one session's graph cache
+DEFAULT_GRAPH_CACHE_BUDGET_BYTES = 512 * 1024 * 1024
+
+def _attribute_payload(attrs: dict):
+    return sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in attrs.items())
+
+def estimate_graph_footprint(G, sample_size: int = 64):
+    """
+    Estimate the memory footprint of a graph in bytes from its node and edge counts
+    plus the average attribute payload of a sample of nodes and edges.
+    """
+    num_nodes = G.number_of_nodes()
+    num_edges = G.number_of_edges()
+
+    node_sample = [attrs for _, attrs in islice(G.nodes(data=True), sample_size)]
+    edge_sample = [attrs for _, _, attrs in islice(G.edges(data=True), sample_size)]
+    node_payload = sum(map(_attribute_payload, node_sample)) / len(node_sample) if node_sample else 0
+    edge_payload = sum(map(_attribute_payload, edge_sample)) / len(edge_sample) if edge_sample else 0
+
+    return int(num_nodes * (NODE_OVERHEAD_BYTES + node_payload) + num_edges * (EDGE_OVERHEAD_BYTES + edge_payload))
+
 class GraphWrapper:
-    def __init__(self, db: StandardDatabase, graph: nxadb.DiGraph, name: str, schema: dict[str, str], description: str):
+    def __init__(self, db: StandardDatabase, graph: "nxadb.DiGraph", name: str, schema: dict[str, str], description: str, loader=None):
         self.db = db
+        self.loader = loader
+        self.cache = None
+        self.footprint = 0
         self.graph = graph
         self.name = name
         self.schema = schema
@@ -69,12 +106,37 @@ class GraphWrapper:
     def __repr__(self):
         return f"NetworkX DiGraph with name '{self.name}', schema: {self.schema}, and overall description: {self.description}"
 
+    @property
+    def graph(self):
+        if self.cache is not None:
+            self.cache.touch(self.name)
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+        # Preloaded graphs are shared by every session (SharedGraphStore), only session-owned ones are charged
+        self.footprint = estimate_graph_footprint(graph) if graph is not None and not self.reloadable else 0
+        if self.cache is not None:
+            self.cache.touch(self.name)
+
+    @property
+    def reloadable(self):
+        return self.db is not None or self.loader is not None
+
     def load_graph(self):
-        if self.graph is not None:
-            print(f"Graph with name {self.graph} is already loaded!")
+        if self._graph is not None:
+            print(f"Graph with name {self.name} is already loaded!")
             return
         
-        self.graph = nxadb.DiGraph(name=self.name, db=self.db)
+        # Shared read-only copy, loaded once per process
+        loader = self.loader or self._load_from_database
+        self.graph = load_shared_graph(self.name, loader)
+
+    def _load_from_database(self):
+        import nx_arangodb as nxadb
+
+        return nxadb.DiGraph(name=self.name, db=self.db)
     
     def get_full_schema(self):
         full_schema = {"nodes": {}, "edges": {}}
@@ -88,9 +150,197 @@ class GraphWrapper:
         return full_schema
 
 
+class GraphCache(dict):
+    """
+    The graph cache of one session: graph name -> GraphWrapper, with a memory budget.
+
+    Only graphs owned by the session (extracted subgraphs) count towards the budget:
+    preloaded graphs are shared by every session, dropping them here would free nothing.
+    Every access to a wrapper's graph marks it as most recently used. When the estimated
+    footprint of the session-owned graphs goes over budget, the least recently used ones
+    are dropped, except the graph the agent currently works on (`chosen`).
+    """
+
+    def __init__(self, budget_bytes: int = DEFAULT_GRAPH_CACHE_BUDGET_BYTES):
+        super().__init__()
+        self.budget_bytes = budget_bytes
+        self.recency = OrderedDict()
+        self.chosen = None
+        # Tools of one agent turn may run in parallel threads and touch the cache together
+        self.lock = threading.RLock()
+
+    def __setitem__(self, name, wrapper: GraphWrapper):
+        with self.lock:
+            super().__setitem__(name, wrapper)
+            wrapper.cache = self
+            self.touch(name)
+
+    def __delitem__(self, name):
+        with self.lock:
+            super().__delitem__(name)
+            self.recency.pop(name, None)
+
+    def memory_usage(self):
+        return sum(wrapper.footprint for wrapper in self.values())
+
+    def choose(self, name):
+        """Mark `name` as the graph the agent works on, it is never evicted."""
+        with self.lock:
+            self.chosen = name
+
+    def touch(self, name):
+        with self.lock:
+            if name not in self:
+                return
+            self.recency[name] = None
+            self.recency.move_to_end(name)
+            self.enforce_budget(keep=name)
+
+    def enforce_budget(self, keep=None):
+        with self.lock:
+            self._enforce_budget(keep)
+
+    def _enforce_budget(self, keep=None):
+        total = self.memory_usage()
+        for name in list(self.recency):
+            if total <= self.budget_bytes:
+                break
+            wrapper = self[name]
+            if name in (keep, self.chosen) or wrapper.footprint == 0:
+                continue
+
+            total -= wrapper.footprint
+            print(f"Evicting graph {name} from the graph cache")
+            del self[name]
+
+
+# Words of a query pointing at a node or edge type, on top of the node attribute names
+ROUTING_KEYWORDS = {
+    "employee": ["employee", "people", "person", "who ", "staff", "colleague", "senior", "junior", "manager", "role", "hire"],
+    "task": ["task", "ticket", "jira", "story point", "deadline", "status"],
+    "interacts with": ["interact", "help", "collaborat", "communicat", "influen", "hub", "authorit", "hits", "central"],
+    "depends on": ["depend", "prerequisite", "preced", "block", "critical path", "cpm", "pert", "slack", "schedul", "earliest", "latest start"],
+    "assigned to": ["assign", "work on", "working on", "responsible", "owner", "workload", "deliver"],
+    "advised": ["advis", "mentor", "review", "quality control", "supervis"],
+}
+
+# Words asking about the whole company rather than one team
+COMPANY_KEYWORDS = ["company", "everyone", "all teams", "across teams", "organization", "whole"]
+
+def _type_keywords(type_name):
+    keywords = [type_name] + ROUTING_KEYWORDS.get(type_name, [])
+    keywords += [attr.lower() for attr in NODE_SCHEMA.get(type_name, {}) if not attr.startswith("_")]
+    return keywords
+
+def _graph_kind(wrapper: GraphWrapper):
+    schema = wrapper.schema if isinstance(wrapper.schema, dict) else {}
+    return tuple(schema.get("nodes", [])), tuple(schema.get("edges", []))
+
+def _kind_score(kind, text: str):
+    # Edge types tell graphs apart better than node types, most graphs share the employee/task nodes
+    nodes, edges = kind
+    node_score = sum(keyword in text for node in nodes for keyword in _type_keywords(node))
+    edge_score = sum(keyword in text for edge in edges for keyword in _type_keywords(edge))
+    return node_score + 2 * edge_score
+
+def _scope_keywords(wrapper: GraphWrapper):
+    """Words in a query or context pinning one graph among graphs of the same kind."""
+    if wrapper.name == "employee_interaction":
+        return COMPANY_KEYWORDS
+    if wrapper.name.endswith("_employee_interaction"):
+        return [wrapper.name.removesuffix("_employee_interaction").lower()]
+    tasks_col = wrapper.schema.get("tasks_col") if isinstance(wrapper.schema, dict) else None
+    if tasks_col:
+        return [f"{tasks_col}/", TASKS_TO_PROJECT_MAP.get(tasks_col, tasks_col).lower()]
+    return []
+
+def _in_scope(names, graph_cache: dict[str, GraphWrapper], text: str):
+    return [name for name in names if any(k in text for k in _scope_keywords(graph_cache[name]))]
+
+def _resolve_from_context(candidates: dict[str, GraphWrapper], context_text: str):
+    """The one graph the context is scoped to (e.g. the project of a task dialog), if any."""
+    in_scope = _in_scope(candidates, candidates, context_text)
+    if len(in_scope) > 1:
+        scores = {name: _kind_score(_graph_kind(candidates[name]), context_text) for name in in_scope}
+        best = max(scores.values())
+        in_scope = [name for name in in_scope if scores[name] == best]
+    return in_scope[0] if len(in_scope) == 1 else None
+
+def route_graph(graph_cache: dict[str, GraphWrapper], query: str, context: str, other_instruction: str = "", last_graph_name: str = None):
+    """
+    Pick a graph without the LLM when the answer is clear, in order:
+    1. a graph named in the chat context (e.g. the graph accordion passes its GraphWrapper)
+    2. keyword and schema matching of the query against NODE_SCHEMA / EDGE_SCHEMA,
+       narrowed down to one team or project by the query
+    3. the last chosen graph, for follow-up questions naming no other team or project
+    4. the team or project the context is about (e.g. the task of a task dialog)
+
+    Returns:
+        (name, reason), or (None, None) when the match is not confident enough
+    """
+    text = f"{query} {other_instruction}".lower()
+    context_text = f"{context}".lower()
+
+    # Preloaded graphs, extracted subgraphs are only reached through the context or the last choice
+    candidates = {name: wrapper for name, wrapper in graph_cache.items() if wrapper.reloadable}
+    kind_scores = {kind: _kind_score(kind, text) for kind in set(map(_graph_kind, candidates.values()))}
+    ranked = sorted(kind_scores.values(), reverse=True)
+    best = ranked[0] if ranked else 0
+    runner_up = ranked[1] if len(ranked) > 1 else 0
+
+    # 1. Pinned by the context, unless the query clearly is about another kind of graph
+    for pinned in re.findall(r"name '([^']+)'", f"{context}"):
+        if pinned in graph_cache and (best == 0 or kind_scores.get(_graph_kind(graph_cache[pinned]), best) > 0):
+            return pinned, "The chat context is about this graph"
+
+    last = graph_cache.get(last_graph_name) if last_graph_name else None
+
+    if best == 0:
+        # Nothing in the query points at a kind of graph, it may still name another team or project
+        if last is not None:
+            same_kind = [name for name, wrapper in candidates.items() if _graph_kind(wrapper) == _graph_kind(last)]
+            in_scope = _in_scope(same_kind, candidates, text)
+            if len(in_scope) == 1:
+                return in_scope[0], "The question is about this team or project"
+            # 3. Keep working on the last graph
+            if not in_scope:
+                return last_graph_name, "Follow-up question on the last chosen graph"
+            return None, None
+
+        # 4. Only the context tells which graph this is about
+        name = _resolve_from_context(candidates, context_text)
+        if name is not None:
+            return name, "The chat context is about this team or project"
+        return None, None
+    if best == runner_up:
+        return None, None
+
+    # 2. One kind of graph matches best, pick the graph of that kind in scope
+    best_kind = next(kind for kind, score in kind_scores.items() if score == best)
+    same_kind = [name for name, wrapper in candidates.items() if _graph_kind(wrapper) == best_kind]
+    reason = f"The question is about {', '.join(best_kind[0])} nodes and '{', '.join(best_kind[1])}' edges"
+
+    # The scope asked for in the query wins over the last choice and the context
+    in_scope = _in_scope(same_kind, candidates, text)
+    if len(in_scope) == 1:
+        return in_scope[0], reason
+    if in_scope:
+        return None, None
+
+    # 3. Same kind of graph as the last one and no other scope named, a follow-up question
+    if last is not None and _graph_kind(last) == best_kind:
+        return last_graph_name, "Follow-up question on the last chosen graph"
+
+    if len(same_kind) > 1:
+        same_kind = _in_scope(same_kind, candidates, context_text)
+        if len(same_kind) != 1:
+            return None, None
+    return same_kind[0], reason
+
+
 choose_graph_template = env.get_template("choose_graph_prompt.jinja")
 @tool
-def choose_graph(graph_cache: dict[str, Any], query: str, context: str, other_instruction: str):
+def choose_graph(graph_cache: dict[str, Any], query: str, context: str, other_instruction: str, last_graph_name: str = None):
     """
     Given the user's query and original context on why this is asked, choose the
     most appropriate graph to load for subsequent queries from a list of graphs
@@ -101,12 +351,19 @@ def choose_graph(graph_cache: dict[str, Any], query: str, context: str, other_in
         query: The original query of the user
         context: The schema of our graph database
         other_instruction: Further instructions derived from other tool interactions or from message history.
+        last_graph_name: The graph chosen last in this conversation, will be provided in the current state
 
     Returns:
         The name of the graph to query from and a brief reason why we chose this one.
     """
+    # Most questions name their graph clearly enough, only ask the LLM when they do not
+    graph_name, reason = route_graph(graph_cache, query, context, other_instruction, last_graph_name)
+    if graph_name is not None:
+        print(f"Routed to graph {graph_name} without the LLM: {reason}")
+        return graph_name, reason
+
     # Initialize llm
-    llm = ChatOpenAI(temperature=0.7, model_name="gpt-4o", api_key=st.secrets["OPENAI_API_KEY"])
+    llm = get_llm(temperature=0.7)
     llm = llm.bind(response_format={"type": "json_object"})
     
     graph_list = {graph_name: str(graph_cache[graph_name]) for graph_name in graph_cache}
@@ -1,18 +1,33 @@
-import re
 from st_link_analysis import EdgeStyle, NodeStyle, st_link_analysis
 import streamlit as st
 from typing import Any
-from langchain_openai import ChatOpenAI
 import networkx as nx
 
 from langchain_core.tools import tool
-from langchain_community.chains.graph_qa.arangodb import ArangoGraphQAChain, ArangoGraph
 from agent import env
 from agent.graph_cache import GraphWrapper
+from agent.code_cache import get_code_cache
+from agent.aql_cache import CachedArangoGraph, CachedArangoGraphQAChain, get_aql_cache
+from agent.schema_store import get_schema_store
+from agent.code_repair import CodeRepairError, clean_code, run_with_repair
+from sandbox import SandboxTimeout, SandboxUnavailable, get_sandbox
 from database import db as adb
+from clients import get_llm
 
 
-arango_graph = ArangoGraph(adb)
+@st.cache_resource
+def get_aql_chain():
+    """
+    The text-to-AQL chain and its LLM client, built once. Its graph answers repeated
+    queries from the AQL cache and reads the database schema from the schema store.
+    """
+    return CachedArangoGraphQAChain.from_llm(
+        llm=get_llm(temperature=0),
+        graph=CachedArangoGraph(adb, get_aql_cache(), get_schema_store()),
+        verbose=True,
+        allow_dangerous_requests=True,
+        return_aql_query=True,
+    )
 
 PRESET_LAYOUT_OPTION = set(["cose", "random", "grid", "circle", "concentric", "breadthfirst", "fcose", "cola"])
 
@@ -44,7 +59,7 @@ def extract_subgraph(
     """
     
     # Initialize llm
-    llm = ChatOpenAI(temperature=0.7, model_name="gpt-4o", api_key=st.secrets["OPENAI_API_KEY"])
+    llm = get_llm(temperature=0.7)
     
     G = graph_wrapper.graph
 
@@ -66,24 +81,25 @@ def extract_subgraph(
     
     if "python" not in layout:
         return None, "Error: You might not have generated Python code"
-    layout_code =  re.sub(r"^```python\n|```$", "", layout, flags=re.MULTILINE).strip()
+    layout_code = clean_code(layout)
     
     print(layout_code)
-    global_vars = {"G_main": G.copy(), "nx": nx}
-    local_vars = {}
-
-    MAX_ATTEMPTS = 3
-    attempt = 1
-    while attempt <= MAX_ATTEMPTS:
-        print(f"Attempt #{attempt}: Running for effect...")
-        try:
-            exec(layout_code, global_vars, local_vars)
-            break
-        except Exception as e:
-            print(f"EXEC ERROR: {e}")
-            if attempt == MAX_ATTEMPTS:
-                return None, "Error: unable to run extract subgraph code, no subgraph was created"
-            attempt += 1
+    outputs = ("GRAPH_NAME", "GRAPH_SCHEMA", "GRAPH_DESCRIPTION", "FINAL_RESULT", "REASON")
+
+    # G_main is the read-only shared graph, only the extracted FINAL_RESULT is materialized
+    def run(code):
+        return get_sandbox().run(code, graph=(graph_wrapper.name, G), graph_var="G_main", outputs=outputs)
+
+    try:
+        local_vars, layout_code, metrics = run_with_repair(llm, layout_code, prompt, run, outputs)
+    except SandboxTimeout as e:
+        print(f"EXEC TIMEOUT: {e}")
+        return None, "Error: extracting the subgraph took too long and was stopped, no subgraph was created"
+    except SandboxUnavailable as e:
+        print(f"SANDBOX UNAVAILABLE: {e}")
+        return None, "Error: the code sandbox is unavailable right now, no subgraph was created, try again later"
+    except CodeRepairError:
+        return None, "Error: unable to run extract subgraph code, no subgraph was created"
 
     print('-'*10)
     GRAPH_NAME = local_vars["GRAPH_NAME"]
@@ -131,15 +147,9 @@ def text_to_aql_to_text(
         A natural language response that answers the original query based on the executed AQL result.
     """
 
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o", api_key=st.secrets["OPENAI_API_KEY"])
+    # Re-asked questions reuse their AQL, and its rows until the collections change
+    chain = get_aql_chain()
 
-    chain = ArangoGraphQAChain.from_llm(
-    	llm=llm,
-    	graph=arango_graph,
-    	verbose=True,
-        allow_dangerous_requests=True
-    )
-    
     answer_prompt = text_to_aql_answer_template.render({
         "query": query,
         "context": context,
@@ -179,44 +189,76 @@ def text_to_nx_algorithm_to_text(
         A response in natural language summarizing the algorithm's output, formatted to align with the original query.
     """
 
-    llm = ChatOpenAI(temperature=0.7, model_name="gpt-4o", api_key=st.secrets["OPENAI_API_KEY"])
+    llm = get_llm(temperature=0.7)
 
-    ######################
-    print("1) Generating NetworkX code")
+    # Code that already answered the same question on the same graph is reused as is
+    code_cache = get_code_cache()
+    full_schema = graph_wrapper.get_full_schema()
+    cache_key = code_cache.key(graph_wrapper.name, full_schema, query, context, other_instruction)
+    cached = code_cache.get(cache_key)
+    print(f"NetworkX code cache: {code_cache.stats()}")
 
-    code_prompt = text_to_nx_code_template.render({
-        "full_schema": graph_wrapper.get_full_schema(),
-        "query": query,
-        "context": context,
-        "other_instruction": other_instruction
-    })
+    # Generated code runs in a sandbox worker, the graph is mapped there from its snapshot
+    sandbox = get_sandbox()
+    graph = (graph_wrapper.name, graph_wrapper.graph)
+    local_vars = {}
 
-    text_to_nx = llm.invoke(code_prompt).content
+    if cached is not None:
+        print("1) Reusing cached NetworkX code")
+        text_to_nx = cached
+        try:
+            local_vars = sandbox.run(text_to_nx, graph=graph)
+        except SandboxTimeout as e:
+            print(f"EXEC TIMEOUT: {e}")
+            return None, "Error: the NetworkX analysis took too long and was stopped, try a narrower question"
+        except SandboxUnavailable as e:
+            print(f"SANDBOX UNAVAILABLE: {e}")
+            return None, "Error: the code sandbox is unavailable right now, try again later"
+        except Exception as e:
+            # The graph changed under the cached code, generate it again
+            print(f"EXEC ERROR in cached code: {e}")
+            code_cache.discard(cache_key)
+            cached = None
 
-    text_to_nx_cleaned = re.sub(r"^```(python|python3)\n|```$", "", text_to_nx, flags=re.MULTILINE).strip()
-    
-    print('-'*10)
-    print(text_to_nx_cleaned)
-    print('-'*10)
+    if cached is None:
+        ######################
+        print("1) Generating NetworkX code")
 
-    ######################
+        code_prompt = text_to_nx_code_template.render({
+            "full_schema": full_schema,
+            "query": query,
+            "context": context,
+            "other_instruction": other_instruction
+        })
 
-    print("\n2) Executing NetworkX code")
-    global_vars = {"G": graph_wrapper.graph, "nx": nx}
-    local_vars = {}
+        text_to_nx = llm.invoke(code_prompt).content
+
+        text_to_nx_cleaned = clean_code(text_to_nx)
+
+        print('-'*10)
+        print(text_to_nx_cleaned)
+        print('-'*10)
+
+        ######################
+
+        print("\n2) Executing NetworkX code")
 
-    MAX_ATTEMPTS = 3
-    attempt = 1
-    while attempt <= MAX_ATTEMPTS:
-        print(f"Attempt #{attempt}: Running for effect...")
         try:
-            exec(text_to_nx_cleaned, global_vars, local_vars)
-            break
-        except Exception as e:
-            print(f"EXEC ERROR: {e}")
-            if attempt == MAX_ATTEMPTS:
-                return None, "Error: unable to run NetworkX to analyze graph, cannot answer query about graph"
-            attempt += 1
+            local_vars, text_to_nx_cleaned, metrics = run_with_repair(
+                llm, text_to_nx_cleaned, code_prompt, lambda code: sandbox.run(code, graph=graph)
+            )
+        except SandboxTimeout as e:
+            print(f"EXEC TIMEOUT: {e}")
+            return None, "Error: the NetworkX analysis took too long and was stopped, try a narrower question"
+        except SandboxUnavailable as e:
+            print(f"SANDBOX UNAVAILABLE: {e}")
+            return None, "Error: the code sandbox is unavailable right now, try again later"
+        except CodeRepairError:
+            return None, "Error: unable to run NetworkX to analyze graph, cannot answer query about graph"
+
+        # Keep the version that ran, repairs included
+        text_to_nx = text_to_nx_cleaned
+        code_cache.put(cache_key, text_to_nx_cleaned, graph_name=graph_wrapper.name)
 
     print('-'*10)
     FINAL_RESULT = local_vars["FINAL_RESULT"]
@@ -228,7 +270,7 @@ def text_to_nx_algorithm_to_text(
     print("3) Formulating final answer")
 
     answer_prompt = text_to_nx_answer_template.render({
-        "full_schema": graph_wrapper.get_full_schema(),
+        "full_schema": full_schema,
         "query": query,
         "other_instruction":  other_instruction,
         "executed_code": text_to_nx,
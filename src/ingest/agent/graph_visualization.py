@@ -2,12 +2,14 @@ import re
 from st_link_analysis import EdgeStyle, NodeStyle, st_link_analysis
 import streamlit as st
 from typing import Any, Union
-from langchain_openai import ChatOpenAI
 import networkx as nx
 
 from langchain_core.tools import tool
 from agent import env
 from agent.graph_cache import GraphWrapper
+from agent.code_repair import CodeRepairError, clean_code, run_with_repair
+from sandbox import SandboxTimeout, SandboxUnavailable, get_sandbox
+from clients import get_llm
 
 PRESET_LAYOUT_OPTION = set(["cose", "random", "grid", "circle", "concentric", "breadthfirst", "fcose", "cola"])
 
@@ -58,9 +60,10 @@ def visualize_graph(
         An instance of GraphVisualizationRequest, to be saved into state later
     """
     # Initialize llm
-    llm = ChatOpenAI(temperature=0.7, model_name="gpt-4o", api_key=st.secrets["OPENAI_API_KEY"])
+    llm = get_llm(temperature=0.7)
     
-    G = graph_wrapper.graph.copy()
+    # Only read to build the elements, no copy needed
+    G = graph_wrapper.graph
     
     # Preparing node and edge and their styles
     nodes = []
@@ -115,24 +118,25 @@ def visualize_graph(
     
     if "python" not in layout:
         return None, "Error: You might not have generated Python code"
-    layout_code =  re.sub(r"^```(python|python3)\n|```$", "", layout, flags=re.MULTILINE).strip()
+    layout_code = clean_code(layout)
     
     print(layout_code)
-    global_vars = {"G": G, "nx": nx}
-    local_vars = {}
 
-    MAX_ATTEMPTS = 3
-    attempt = 1
-    while attempt <= MAX_ATTEMPTS:
-        print(f"Attempt #{attempt}: Running for effect...")
-        try:
-            exec(layout_code, global_vars, local_vars)
-            break
-        except Exception as e:
-            print(f"EXEC ERROR: {e}")
-            if attempt == MAX_ATTEMPTS:
-                return None, "Error: unable to run custom layout code"
-            attempt += 1
+    def run(code):
+        return get_sandbox().run(
+            code, graph=(graph_wrapper.name, graph_wrapper.graph), outputs=("FINAL_RESULT", "REASON")
+        )
+
+    try:
+        local_vars, layout_code, metrics = run_with_repair(llm, layout_code, prompt, run, ("FINAL_RESULT", "REASON"))
+    except SandboxTimeout as e:
+        print(f"EXEC TIMEOUT: {e}")
+        return None, "Error: the custom layout code took too long and was stopped"
+    except SandboxUnavailable as e:
+        print(f"SANDBOX UNAVAILABLE: {e}")
+        return None, "Error: the code sandbox is unavailable right now, try again later"
+    except CodeRepairError:
+        return None, "Error: unable to run custom layout code"
 
     print('-'*10)
     FINAL_RESULT = local_vars["FINAL_RESULT"]
@@ -1,24 +1,13 @@
 import streamlit as st
 import networkx as nx
 import pandas as pd
-import nx_arangodb as nxadb
 import re
 
-from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
-from arango import ArangoClient
-from langchain_openai import ChatOpenAI
-from langchain_community.graphs import ArangoGraph
-
-
-db = ArangoClient(hosts="https://b61c3b83bfe6.arangodb.cloud:8529") \
-    .db(username="root", 
-        password="RHr0KzkRUVlp61IisH8G", 
-        name="DAC_devops_log",
-        verify=True)
-
-model = ChatOpenAI(model="gpt-4o", temperature=0.7, api_key=st.secrets["OPENAI_API_KEY"])
 
+from agent.hits_engine import get_hits_scores, get_team_hits_scores
+from agent.schema_store import get_schema_store
+from clients import get_llm
 
 
 @tool
@@ -33,21 +22,15 @@ def choose_graph(question):
     Returns:
         The name of the graph to query from.
     """    
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o", api_key=st.secrets["OPENAI_API_KEY"])    
+    import nx_arangodb as nxadb
 
-    db = ArangoClient(hosts="https://b61c3b83bfe6.arangodb.cloud:8529") \
-    .db(username="root", 
-        password="RHr0KzkRUVlp61IisH8G", 
-        name="DAC_devops_log",
-        verify=True)
-    
-    arango_graph = ArangoGraph(db)
+    llm = get_llm(temperature=0)
 
     graph_name = llm.invoke(f"""
     I have a graph database with the following information:
     
     Graph Schema:
-    {arango_graph.schema}
+    {get_schema_store().get()}
     
     User question:
     {question}
@@ -69,21 +52,22 @@ def create_hits_table(G_adb):
     Create a pandas DataFrame from the HITS analysis of our graph.
 
     Args:
-        G_adb: The ArangoDB graph object
+        G_adb: The already-loaded employee interaction graph
 
     Returns:
         A pandas DataFrame with the HITS analysis results
     """
-    G_adb = nxadb.DiGraph(name="emp_interaction1")
-    hubs, authorities = nx.hits(G_adb, max_iter=10000, tol=1e-2)
+    # Sparse power iteration on the already-loaded graph, warm-started from the
+    # previous scores of the same graph
+    nodes, hubs, authorities = get_hits_scores(G_adb)
 
     print("got hub and authority")
 
     # Create a DataFrame from hubs and authorities
     hits_df = pd.DataFrame({
-        'EmpID': list(hubs.keys()),
-        'Hub_Score': list(hubs.values()),
-        'Authority_Score': list(authorities.values())
+        'EmpID': pd.Series(nodes, dtype=str),
+        'Hub_Score': hubs,
+        'Authority_Score': authorities
     })
 
     print(hits_df.head(10))
@@ -99,6 +83,35 @@ def create_hits_table(G_adb):
 
     return hits_df
 
+@tool
+def create_team_hits_table(G_adb):
+    """
+    Create a pandas DataFrame with the HITS rankings of every team and of the whole company at once.
+
+    Each team is ranked on the interactions between its own members, the whole company (team '*')
+    on every interaction.
+
+    Args:
+        G_adb: The full employee interaction graph
+
+    Returns:
+        A pandas DataFrame keyed by (Team, EmpID) with the Hub and Authority scores
+    """
+    keys, hubs, authorities = get_team_hits_scores(G_adb)
+
+    hits_df = pd.DataFrame({
+        'Team': [team for team, _ in keys],
+        'EmpID': pd.Series([node for _, node in keys], dtype=str).str.replace('employee/', ''),
+        'Hub_Score': hubs,
+        'Authority_Score': authorities
+    })
+
+    # Sort by Hub Score in descending order inside each team
+    hits_df = hits_df.sort_values(['Team', 'Hub_Score'], ascending=[True, False])
+    hits_df = hits_df.set_index(['Team', 'EmpID'])
+
+    return hits_df
+
 @tool
 def ask_hits_question(question, df, context = None, model_name="gpt-4o"):
     """
@@ -118,7 +131,7 @@ def ask_hits_question(question, df, context = None, model_name="gpt-4o"):
     Returns:
         Answer from ChatGPT about the dataframe
     """
-    llm = ChatOpenAI(temperature=0, model_name=model_name, api_key=st.secrets["OPENAI_API_KEY"])
+    llm = get_llm(temperature=0, model_name=model_name)
     
     # # Get dataframe info
     # df_info = df.info(buf=None, max_cols=None, memory_usage=None, show_counts=None)
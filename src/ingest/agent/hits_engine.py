@@ -0,0 +1,280 @@
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from graph_hash import graph_content_hash, node_attribute
+
+
+def graph_revision(G, weight: str = None):
+    """
+    Revision stamp of an in-memory graph: a hash of its nodes and edges, and of
+    the edge `weight` when one is used. Any rewiring or weight change changes it.
+    """
+    return graph_content_hash(G, edge_attr=weight)
+
+
+class InteractionMatrix:
+    """
+    CSR adjacency of a graph plus its node-id table, built once per graph revision.
+
+    An edge u -> v contributes A[u, v]; undirected graphs contribute both directions.
+    """
+
+    def __init__(self, nodes: list, A: sp.csr_array, revision=None):
+        self.nodes = nodes
+        self.index = {node: i for i, node in enumerate(nodes)}
+        self.A = A
+        self.AT = A.T.tocsr()
+        self.revision = revision
+
+    @classmethod
+    def from_graph(cls, G, weight: str = None):
+        """
+        Build the sparse adjacency of `G` in one pass over its edges.
+
+        Args:
+            G: A NetworkX / nx-arangodb graph
+            weight: Optional edge attribute used as weight (default: every edge counts 1)
+
+        Returns:
+            An InteractionMatrix
+        """
+        nodes = list(G.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+
+        if weight is None:
+            edges = ((u, v, 1.0) for u, v in G.edges())
+        else:
+            edges = G.edges(data=weight, default=1.0)
+
+        rows, cols, values = [], [], []
+        for u, v, w in edges:
+            rows.append(index[u])
+            cols.append(index[v])
+            values.append(float(w))
+
+        if not G.is_directed():
+            rows, cols, values = rows + cols, cols + rows, values + values
+
+        n = len(nodes)
+        A = sp.coo_array((values, (rows, cols)), shape=(n, n)).tocsr()
+        A.sum_duplicates()
+        return cls(nodes, A, graph_revision(G, weight))
+
+    def align(self, scores: dict):
+        """Turn a {node: score} dict from a previous revision into a start vector for this one."""
+        if not scores:
+            return None
+        known = [scores.get(node) for node in self.nodes]
+        fallback = float(np.mean([s for s in known if s is not None])) if any(s is not None for s in known) else 0.0
+        return np.array([fallback if s is None else s for s in known], dtype=np.float64)
+
+
+def _normalize(v, block_ptr):
+    """
+    Scale every block of `v` to sum 1, in place. Blocks summing to 0 (no edges)
+    become uniform. Returns False when every block was empty.
+    """
+    sizes = np.diff(block_ptr)
+    sums = np.add.reduceat(v, block_ptr[:-1])
+    empty = sums <= 0
+    v *= np.repeat(np.where(empty, 0.0, 1.0 / np.where(empty, 1.0, sums)), sizes)
+    v += np.repeat(np.where(empty, 1.0 / sizes, 0.0), sizes)
+    return not empty.all()
+
+
+def power_iterate(matrix: InteractionMatrix, hubs=None, max_iter: int = 1000, tol: float = 1e-8, block_ptr=None):
+    """
+    HITS by power iteration with sparse mat-vec products.
+
+    A block-diagonal matrix holds several independent graphs; `block_ptr` gives
+    the boundaries of every block and each block is normalized and checked for
+    convergence on its own, so all of them are ranked in the same iterations.
+
+    Args:
+        matrix: The InteractionMatrix of the graph
+        hubs: Optional start vector for the hub scores (warm start), uniform otherwise
+        max_iter: Maximum number of iterations
+        tol: Stop when the L1 change of every block of the hub vector falls below this
+        block_ptr: Optional block boundaries [0, ..., n], defaults to a single block
+
+    Returns:
+        (hubs, authorities, iterations), every block of both vectors normalized to sum 1
+    """
+    n = len(matrix.nodes)
+    if n == 0:
+        return np.zeros(0), np.zeros(0), 0
+    block_ptr = np.array([0, n]) if block_ptr is None else np.asarray(block_ptr)
+
+    h = np.zeros(n) if hubs is None else np.asarray(hubs, dtype=np.float64).copy()
+    _normalize(h, block_ptr)
+    a = np.zeros(n)
+
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        a = matrix.AT @ h
+        if not _normalize(a, block_ptr):
+            # No edges at all, every node is equally (un)important
+            return h, a, iterations
+
+        h_next = matrix.A @ a
+        _normalize(h_next, block_ptr)
+        delta = np.add.reduceat(np.abs(h_next - h), block_ptr[:-1])
+        h = h_next
+        if (delta < tol).all():
+            break
+
+    return h, a, iterations
+
+
+# Last adjacency and HITS vectors of every graph, keyed by graph name.
+# Shared by every session and tool thread: entries are replaced, never updated in place.
+HITS_CACHE: dict[str, dict] = {}
+_HITS_CACHE_LOCK = threading.Lock()
+
+
+def _cache_get(key):
+    if not key:
+        return None
+    with _HITS_CACHE_LOCK:
+        return HITS_CACHE.get(key)
+
+
+def _cache_put(key, entry: dict):
+    if key:
+        with _HITS_CACHE_LOCK:
+            HITS_CACHE[key] = entry
+
+
+def _get_matrix(G):
+    """The InteractionMatrix of `G`, rebuilt only when the graph revision changed."""
+    name = getattr(G, "name", None)
+    cached = _cache_get(name)
+    if cached is not None and cached["matrix"].revision == graph_revision(G):
+        return cached["matrix"]
+
+    matrix = InteractionMatrix.from_graph(G)
+    # Keep the previous hub vector around as the next warm start
+    _cache_put(name, {"matrix": matrix, "hubs": cached["hubs"] if cached is not None else None})
+    return matrix
+
+
+def get_hits_scores(G, max_iter: int = 1000, tol: float = 1e-8, warm_start: dict = None):
+    """
+    Hub and authority scores of `G`, reusing the cached adjacency while the graph
+    revision is unchanged and warm-starting from the previous hub vector.
+
+    Args:
+        G: The employee interaction graph (GraphWrapper.graph)
+        max_iter: Maximum number of power iterations
+        tol: Convergence tolerance on the L1 change of the hub vector
+        warm_start: Optional {node: hub score} to start from, defaults to the last
+            result computed for the same graph name
+
+    Returns:
+        (nodes, hubs, authorities) with hubs/authorities as arrays aligned with nodes
+    """
+    name = getattr(G, "name", None)
+    cached = _cache_get(name)
+    matrix = _get_matrix(G)
+
+    if warm_start is None and cached is not None:
+        warm_start = cached["hubs"]
+    hubs, authorities, iterations = power_iterate(matrix, matrix.align(warm_start), max_iter, tol)
+    print(f"HITS on {name} converged in {iterations} iteration(s)")
+
+    _cache_put(name, {
+        "matrix": matrix,
+        "hubs": dict(zip(matrix.nodes, hubs)),
+    })
+    return matrix.nodes, hubs, authorities
+
+
+COMPANY = "*"
+
+
+def get_team_hits_scores(G, team_attr: str = "Team", teams: list[str] = None, include_company: bool = True,
+                         max_iter: int = 1000, tol: float = 1e-8):
+    """
+    HITS rankings of every team (on its own induced subgraph) and of the whole
+    company, computed together in one stacked power iteration.
+
+    The company adjacency and the block-diagonal matrix of all intra-team edges
+    are stacked into a single sparse matrix, so no per-team graph copy is made.
+
+    Args:
+        G: The full `employee_interaction` graph
+        team_attr: Node attribute holding the team partition
+        teams: Optional subset of teams to rank, defaults to every team in the graph
+        include_company: Also rank the whole company, under team '*'
+        max_iter: Maximum number of power iterations
+        tol: Convergence tolerance per team
+
+    Returns:
+        (keys, hubs, authorities) where keys is a list of (team, node) pairs
+    """
+    matrix = _get_matrix(G)
+    cache_key = f"{getattr(G, 'name', None)}/teams"
+    # The team blocks also depend on which team every node is in
+    revision = (
+        matrix.revision,
+        graph_content_hash(G, node_attr=team_attr),
+        None if teams is None else tuple(sorted(teams)),
+        include_company,
+    )
+    cached = _cache_get(cache_key)
+
+    if cached is not None and cached["matrix"].revision == revision:
+        stacked_matrix, block_ptr = cached["matrix"], cached["block_ptr"]
+    else:
+        stacked_matrix, block_ptr = _stack_teams(G, matrix, team_attr, teams, include_company)
+        stacked_matrix.revision = revision
+
+    warm_start = stacked_matrix.align(cached["hubs"]) if cached is not None else None
+    hubs, authorities, iterations = power_iterate(stacked_matrix, warm_start, max_iter, tol, block_ptr)
+    print(f"Batched HITS on {len(block_ptr) - 1} team(s) converged in {iterations} iteration(s)")
+
+    _cache_put(cache_key, {
+        "matrix": stacked_matrix,
+        "block_ptr": block_ptr,
+        "hubs": dict(zip(stacked_matrix.nodes, hubs)),
+    })
+    return stacked_matrix.nodes, hubs, authorities
+
+
+def _stack_teams(G, matrix: InteractionMatrix, team_attr: str, teams, include_company: bool):
+    """Stack the company adjacency and the block-diagonal intra-team adjacency."""
+    n = len(matrix.nodes)
+    labels = np.array([str(team) for team in node_attribute(G, matrix.nodes, team_attr)], dtype=object)
+    selected = np.ones(n, dtype=bool) if teams is None else np.isin(labels, list(teams))
+    team_names, codes = np.unique(labels[selected], return_inverse=True)
+
+    # Employees grouped team by team
+    order = np.argsort(codes, kind="stable")
+    members = np.flatnonzero(selected)[order]
+    codes = codes[order]
+
+    # Position of every selected employee inside the team blocks, and its team
+    position = np.full(n, -1, dtype=np.int64)
+    position[members] = np.arange(len(members))
+    team_of = np.full(n, -1, dtype=np.int64)
+    team_of[members] = codes
+
+    # Keep only edges inside one team, re-indexed into the team blocks
+    coo = matrix.A.tocoo()
+    intra = (team_of[coo.row] >= 0) & (team_of[coo.row] == team_of[coo.col])
+    m = len(members)
+    teams_A = sp.csr_array(
+        (coo.data[intra], (position[coo.row[intra]], position[coo.col[intra]])),
+        shape=(m, m),
+    )
+    team_ptr = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(team_names)))))
+
+    keys = [(team_names[c], matrix.nodes[i]) for c, i in zip(codes, members)]
+    if not include_company:
+        return InteractionMatrix(keys, teams_A), team_ptr
+
+    keys = [(COMPANY, node) for node in matrix.nodes] + keys
+    stacked = sp.block_diag([matrix.A, teams_A], format="csr")
+    return InteractionMatrix(keys, stacked), np.concatenate(([0], n + team_ptr))
@@ -0,0 +1,89 @@
+import threading
+
+import streamlit as st
+from langchain_community.graphs import ArangoGraph
+
+import database as db
+from clients import timed
+
+
+class _SchemaSampler(ArangoGraph):
+    """ArangoGraph that only samples the collections when generate_schema is called."""
+
+    def set_schema(self, schema=None):
+        # ArangoGraph samples every collection twice while constructing, the store samples on its own
+        pass
+
+
+class SchemaStore:
+    """
+    Process-wide ArangoDB schema for the agent's prompts and chains, in the format of
+    ArangoGraph.schema, stamped with the revisions of the collections it was sampled at.
+
+    Only the very first read samples the collections in the caller's thread. After that
+    readers always get the stored schema right away; when the revisions moved on, one
+    background thread samples the schema again and swaps it in once done.
+    """
+
+    def __init__(self, adb):
+        self._sampler = _SchemaSampler(adb)
+        self._schema = None
+        self._revision = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._first_sample = threading.Lock()
+
+    @staticmethod
+    def current_revision():
+        collections, graphs = db.get_collection_and_graph_names()
+        return db.get_collection_revisions(collections), graphs
+
+    def get(self):
+        """The schema, sampling it only if nothing was sampled yet."""
+        revision = self.current_revision()
+        with self._lock:
+            schema = self._schema
+        if schema is None:
+            # Every caller of the first read waits for the same sampling
+            with self._first_sample:
+                if self._schema is None:
+                    self._sample(revision)
+                return self._schema
+
+        self.refresh_in_background(revision)
+        return schema
+
+    def refresh_in_background(self, revision=None):
+        """Sample the schema again in a background thread, if it is missing or older than `revision`."""
+        revision = self.current_revision() if revision is None else revision
+        with self._lock:
+            if self._refreshing or (self._schema is not None and self._revision == revision):
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, args=(revision,), name="schema-refresh", daemon=True).start()
+
+    def _refresh(self, revision):
+        try:
+            if self._schema is None:
+                # A warm-up before the first read, that read waits for it instead of sampling again
+                with self._first_sample:
+                    if self._schema is None:
+                        self._sample(revision)
+            else:
+                self._sample(revision)
+        except Exception as e:
+            print(f"Could not refresh the database schema, keeping the previous one: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _sample(self, revision):
+        with timed("ArangoDB schema sampling"):
+            schema = self._sampler.generate_schema()
+        with self._lock:
+            self._schema, self._revision = schema, revision
+
+
+@st.cache_resource
+def get_schema_store():
+    return SchemaStore(db.db)
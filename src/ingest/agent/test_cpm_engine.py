@@ -0,0 +1,155 @@
+import networkx as nx
+import numpy as np
+import pytest
+from scipy import stats
+
+from agent.cpm_engine import SCHEDULE_CACHE, TaskDAG, beta_quantile_table, get_schedule, simulate_pert
+
+
+def _random_task_graph(n=300, p=0.02, seed=0, name="test_dependence_graph"):
+    rng = np.random.default_rng(seed)
+    G = nx.DiGraph(name=name)
+    for i in range(n):
+        G.add_node(f"tasks/{i}", StoryPoints=str(rng.integers(1, 9)))
+    # Edges only go forward in node order, so the graph is a DAG
+    for u in range(n):
+        for v in np.flatnonzero(rng.random(n - u - 1) < p) + u + 1:
+            G.add_edge(f"tasks/{u}", f"tasks/{v}")
+    G.add_node("tasks/no_points")
+    return G
+
+
+def _baseline_cpm(G):
+    """The dict-based CPM loop the engine replaced."""
+    duration = {node: int(G.nodes[node].get("StoryPoints", "1")) for node in G}
+    es, ef = {}, {}
+    for node in nx.topological_sort(G):
+        es[node] = max((ef.get(pred, 0) for pred in G.predecessors(node)), default=0)
+        ef[node] = es[node] + duration[node]
+
+    lf, ls = {}, {}
+    project_duration = max(ef.values())
+    for node in reversed(list(nx.topological_sort(G))):
+        lf[node] = min((ls.get(succ, project_duration) for succ in G.successors(node)), default=project_duration)
+        ls[node] = lf[node] - duration[node]
+    return es, ef, ls, lf
+
+
+def _as_dicts(schedule):
+    nodes = schedule.dag.nodes
+    return tuple(dict(zip(nodes, values.tolist())) for values in (schedule.es, schedule.ef, schedule.ls, schedule.lf))
+
+
+@pytest.fixture
+def schedule_cache():
+    SCHEDULE_CACHE.clear()
+    yield SCHEDULE_CACHE
+    SCHEDULE_CACHE.clear()
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_schedule_matches_baseline(seed):
+    G = _random_task_graph(seed=seed)
+    assert _as_dicts(TaskDAG.from_graph(G).schedule()) == _baseline_cpm(G)
+
+
+def test_incremental_update_matches_full_recompute(schedule_cache):
+    G = _random_task_graph()
+    get_schedule(G)
+    cached = schedule_cache[G.name]
+    cached_es = cached.es.copy()
+
+    changed = ["tasks/3", "tasks/150", "tasks/299"]
+    for task in changed:
+        G.nodes[task]["StoryPoints"] = "20"
+    updated = get_schedule(G, changed_tasks=changed)
+
+    assert _as_dicts(updated) == _baseline_cpm(G)
+    # The update ran on a copy, the schedule handed out before is untouched
+    assert np.array_equal(cached.es, cached_es)
+
+
+def test_successive_incremental_updates_keep_earlier_edits(schedule_cache):
+    G = nx.DiGraph([("a", "c"), ("b", "c")], name="successive")
+    nx.set_node_attributes(G, "1", "StoryPoints")
+    assert get_schedule(G).project_duration == 2
+
+    G.nodes["a"]["StoryPoints"] = "5"
+    assert get_schedule(G, changed_tasks=["a"]).project_duration == 6
+
+    G.nodes["b"]["StoryPoints"] = "2"
+    assert _as_dicts(get_schedule(G, changed_tasks=["b"])) == _baseline_cpm(G)
+
+
+def test_unlisted_changes_are_picked_up(schedule_cache):
+    G = _random_task_graph()
+    get_schedule(G)
+
+    G.nodes["tasks/10"]["StoryPoints"] = "30"
+    G.nodes["tasks/20"]["StoryPoints"] = "30"
+    assert _as_dicts(get_schedule(G, changed_tasks=["tasks/10"])) == _baseline_cpm(G)
+
+
+def test_rewired_graph_is_recomputed(schedule_cache):
+    G = _random_task_graph()
+    get_schedule(G)
+
+    # Same number of nodes and edges, different dependencies
+    u, v = next(iter(G.edges()))
+    G.remove_edge(u, v)
+    G.add_edge("tasks/0", "tasks/299")
+    assert _as_dicts(get_schedule(G, changed_tasks=["tasks/0"])) == _baseline_cpm(G)
+
+
+def test_pert_without_uncertainty_is_cpm():
+    G = _random_task_graph()
+    dag = TaskDAG.from_graph(G)
+    schedule = dag.schedule()
+    duration = dag.duration.astype(np.float64)
+
+    result = simulate_pert(dag, duration, duration, duration, trials=50, seed=0)
+
+    assert np.allclose(result.completion_times, schedule.project_duration)
+    assert np.array_equal(result.criticality == 1, schedule.slack == 0)
+    assert np.allclose(result.mean_finish, schedule.ef)
+
+
+@pytest.mark.parametrize("distribution", ["triangular", "beta"])
+def test_pert_completion_within_bounds(distribution):
+    G = _random_task_graph()
+    dag = TaskDAG.from_graph(G)
+    mode = dag.duration.astype(np.float64)
+    low, high = mode * 0.5, mode * 2
+
+    result = simulate_pert(dag, low, mode, high, trials=2000, distribution=distribution, seed=0)
+
+    shortest = TaskDAG(dag.nodes, *_edges(dag), low.astype(np.int64)).schedule().project_duration
+    longest = TaskDAG(dag.nodes, *_edges(dag), high.astype(np.int64) + 1).schedule().project_duration
+    assert shortest <= result.completion_times.min() <= result.completion_times.max() <= longest
+    assert ((result.criticality >= 0) & (result.criticality <= 1)).all()
+
+
+def _edges(dag):
+    counts = np.diff(dag.succ_indptr)
+    return np.repeat(np.arange(len(dag.nodes)), counts), dag.succ_indices
+
+
+def test_beta_quantile_table_matches_scipy():
+    alpha = np.array([1.0, 2.5, 5.0, 1.2])
+    beta = np.array([5.0, 2.5, 1.0, 4.8])
+    grid = np.linspace(0, 1, 257)
+
+    expected = stats.beta.ppf(grid[None, :], alpha[:, None], beta[:, None])
+    assert np.abs(beta_quantile_table(alpha, beta, 257) - expected).max() < 1e-3
+
+
+def test_beta_pert_samples_follow_beta_pert():
+    # One task, so the completion time is the sampled duration itself
+    dag = TaskDAG(["t"], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.array([3]))
+    low, mode, high = np.array([1.0]), np.array([3.0]), np.array([9.0])
+
+    result = simulate_pert(dag, low, mode, high, trials=20000, distribution="beta", seed=0)
+
+    alpha, beta = 1 + 4 * (mode - low) / (high - low), 1 + 4 * (high - mode) / (high - low)
+    expected = stats.beta(alpha[0], beta[0], loc=low[0], scale=(high - low)[0])
+    assert stats.kstest(result.completion_times, expected.cdf).pvalue > 0.01
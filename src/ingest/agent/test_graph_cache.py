@@ -0,0 +1,118 @@
+import networkx as nx
+import pytest
+
+from agent.graph_cache import GraphCache, GraphWrapper, route_graph
+from database import TASKS_TO_PROJECT_MAP
+
+TEAMS = ["Business Intelligence", "Data Engineering", "Data Science", "Data Governance"]
+
+
+def _preloaded(name, schema):
+    # Preloaded graphs reload through their loader, like the ones app.py puts in the cache
+    return GraphWrapper(None, None, name, schema, f"The graph {name}", loader=nx.DiGraph)
+
+
+@pytest.fixture
+def graph_cache():
+    cache = GraphCache()
+    for tasks_col in TASKS_TO_PROJECT_MAP:
+        if tasks_col != "*":
+            name = f"{tasks_col}_dependence_graph"
+            cache[name] = _preloaded(name, {"nodes": ["task"], "edges": ["depends on"], "tasks_col": tasks_col})
+
+    interaction = {"nodes": ["employee"], "edges": ["interacts with"]}
+    cache["employee_interaction"] = _preloaded("employee_interaction", interaction)
+    for team in TEAMS:
+        cache[f"{team}_employee_interaction"] = _preloaded(f"{team}_employee_interaction", interaction)
+
+    assignment = {"nodes": ["task", "employee"], "edges": ["assigned to", "advised"]}
+    cache["bi_team_task_assignment"] = _preloaded("bi_team_task_assignment", assignment)
+    return cache
+
+
+@pytest.mark.parametrize("last, query, expected", [
+    # The scope named in the query wins over the last chosen graph
+    ("Business Intelligence_employee_interaction", "Who is the most central person in the Data Science team?",
+     "Data Science_employee_interaction"),
+    ("Data Science_employee_interaction", "And in the whole company?", "employee_interaction"),
+    ("bi_tasks_dependence_graph", "What is the critical path of DataForge ETL?", "de_tasks_dependence_graph"),
+    # Follow-up questions naming no other scope stay on the last graph
+    ("Data Science_employee_interaction", "Who are the top hubs?", "Data Science_employee_interaction"),
+    ("bi_tasks_dependence_graph", "Why is it critical?", "bi_tasks_dependence_graph"),
+])
+def test_query_scope_before_last_graph(graph_cache, last, query, expected):
+    name, _ = route_graph(graph_cache, query, "", last_graph_name=last)
+    assert name == expected
+
+
+def test_context_pins_graph(graph_cache):
+    context = f"The user might want to know more about this graph {graph_cache['de_tasks_dependence_graph']}"
+    name, _ = route_graph(graph_cache, "What blocks the most work?", context)
+    assert name == "de_tasks_dependence_graph"
+
+
+def test_task_dialog_context_resolves_without_keywords(graph_cache):
+    task = {"TaskID": "42", "Description": "Build the ingestion job", "Project": "StreamSync Pipeline"}
+    context = f"You are answering question about a JIRA task in this project, here is the task's details {task}"
+    name, _ = route_graph(graph_cache, "Can you explain this?", context)
+    assert name == "bi_tasks_dependence_graph"
+
+
+def test_ambiguous_query_is_left_to_the_llm(graph_cache):
+    assert route_graph(graph_cache, "Who is the most central person?", "") == (None, None)
+    assert route_graph(graph_cache, "Can you explain this?", "") == (None, None)
+
+
+def test_extracted_subgraph_is_followed_up(graph_cache):
+    graph_cache["subgraph"] = GraphWrapper(None, nx.DiGraph(), "subgraph", {"nodes": ["task"], "edges": ["depends on"]}, "")
+    name, _ = route_graph(graph_cache, "What is the critical path?", "", last_graph_name="subgraph")
+    assert name == "subgraph"
+
+
+def _subgraph(name, size=100):
+    # Extracted subgraphs have no loader, they are owned by the session
+    return GraphWrapper(None, nx.path_graph(size), name, {"nodes": ["task"], "edges": ["depends on"]}, "")
+
+
+def _budget_for(count, size=100):
+    return count * _subgraph("probe", size).footprint
+
+
+def test_least_recently_used_subgraph_is_evicted_first():
+    cache = GraphCache(budget_bytes=_budget_for(3))
+    for name in ["s1", "s2", "s3"]:
+        cache[name] = _subgraph(name)
+
+    # Touching s1 makes s2 the least recently used
+    cache["s1"].graph
+    cache["s4"] = _subgraph("s4")
+    assert list(cache) == ["s1", "s3", "s4"]
+
+    cache["s5"] = _subgraph("s5")
+    assert list(cache) == ["s1", "s4", "s5"]
+    assert cache.memory_usage() <= cache.budget_bytes
+
+
+def test_chosen_graph_is_never_evicted():
+    cache = GraphCache(budget_bytes=_budget_for(2))
+    cache["chosen"] = _subgraph("chosen")
+    cache.choose("chosen")
+
+    for name in ["s1", "s2", "s3"]:
+        cache[name] = _subgraph(name)
+    assert "chosen" in cache
+    assert list(cache) == ["chosen", "s3"]
+
+
+def test_shared_graphs_do_not_count_towards_the_budget(graph_cache):
+    big = nx.path_graph(5000)
+    graph_cache["employee_interaction"].graph = big
+    assert graph_cache["employee_interaction"].footprint == 0
+
+    graph_cache.budget_bytes = _budget_for(1)
+    graph_cache["s1"] = _subgraph("s1")
+    assert graph_cache.memory_usage() == graph_cache["s1"].footprint
+    # Over budget subgraphs are dropped, preloaded graphs stay loaded
+    graph_cache["s2"] = _subgraph("s2")
+    assert "s1" not in graph_cache
+    assert graph_cache["employee_interaction"].graph is big
@@ -0,0 +1,70 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from agent.hits_engine import COMPANY, HITS_CACHE, get_hits_scores, get_team_hits_scores
+
+TEAMS = ["Business Intelligence", "Data Engineering", "Data Science"]
+
+
+def _interaction_graph(n=120, p=0.08, seed=0, name="employee_interaction"):
+    G = nx.gnp_random_graph(n, p, seed=seed, directed=True)
+    G.name = name
+    for node in G:
+        G.nodes[node]["Team"] = TEAMS[node % len(TEAMS)]
+    return G
+
+
+def _assert_matches_nx(G, nodes, hubs, authorities):
+    nx_hubs, nx_authorities = nx.hits(G, max_iter=1000, tol=1e-10)
+    assert np.allclose(hubs, [nx_hubs[node] for node in nodes], atol=1e-6)
+    assert np.allclose(authorities, [nx_authorities[node] for node in nodes], atol=1e-6)
+
+
+@pytest.fixture(autouse=True)
+def clear_hits_cache():
+    HITS_CACHE.clear()
+    yield
+    HITS_CACHE.clear()
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_hits_matches_networkx(seed):
+    G = _interaction_graph(seed=seed)
+    _assert_matches_nx(G, *get_hits_scores(G))
+
+
+def test_rewired_graph_is_not_served_from_cache():
+    G = _interaction_graph()
+    get_hits_scores(G)
+
+    # Same number of nodes and edges, different interactions
+    u, v = next(iter(G.edges()))
+    G.remove_edge(u, v)
+    G.add_edge(*next((a, b) for a in G for b in G if a != b and not G.has_edge(a, b)))
+    _assert_matches_nx(G, *get_hits_scores(G))
+
+
+def test_team_hits_match_networkx_per_team():
+    G = _interaction_graph()
+    keys, hubs, authorities = get_team_hits_scores(G)
+
+    for team in [COMPANY] + TEAMS:
+        rows = [i for i, (key_team, _) in enumerate(keys) if key_team == team]
+        nodes = [keys[i][1] for i in rows]
+        subgraph = G if team == COMPANY else G.subgraph(nodes)
+        _assert_matches_nx(subgraph, nodes, hubs[rows], authorities[rows])
+
+
+def test_team_hits_follow_team_changes():
+    G = _interaction_graph()
+    get_team_hits_scores(G, include_company=False)
+
+    # Move one employee to another team, the team blocks have to be rebuilt
+    G.nodes[0]["Team"] = TEAMS[1]
+    keys, hubs, authorities = get_team_hits_scores(G, include_company=False)
+    assert (TEAMS[1], 0) in keys
+
+    rows = [i for i, (team, _) in enumerate(keys) if team == TEAMS[1]]
+    nodes = [keys[i][1] for i in rows]
+    _assert_matches_nx(G.subgraph(nodes), nodes, hubs[rows], authorities[rows])
@@ -0,0 +1,373 @@
+import streamlit as st
+from typing import Annotated, Sequence, TypedDict
+from langchain_core.messages import BaseMessage, ToolMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langgraph.graph.message import add_messages
+from langgraph.graph import StateGraph, END
+
+import pandas as pd
+from typing import (
+    Annotated,
+    Sequence,
+    TypedDict,
+    Optional
+)
+
+from agent import env
+from clients import get_llm
+from agent.graph_cache import GraphWrapper, choose_graph
+from agent.utils import get_weather
+from agent.graph_visualization import visualize_graph
+from agent.graph_qa import extract_subgraph, text_to_aql_to_text, text_to_nx_algorithm_to_text
+from agent.cpm import create_cpm_table, create_pert_table, ask_cpm_question
+from agent.hits import create_hits_table, create_team_hits_table, ask_hits_question
+
+# Set up tools
+tools = [
+    get_weather,
+    choose_graph,
+    visualize_graph,
+    create_cpm_table,
+    create_pert_table,
+    ask_cpm_question,
+    create_hits_table,
+    create_team_hits_table,
+    ask_hits_question,
+    extract_subgraph,
+    text_to_aql_to_text,
+    text_to_nx_algorithm_to_text,
+]
+tools_by_name = {tool.name: tool for tool in tools}
+
+# Set up OpenAI model, created on the first agent turn
+@st.cache_resource(show_spinner=False)
+def get_model():
+    return get_llm(temperature=0.7).bind_tools(tools, parallel_tool_calls=True)
+
+class AgentState(TypedDict):
+    # List of messages so far
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+
+    # The dataframe we are working with
+    df: Optional[pd.DataFrame]  # The resulting (CPM, hits?) dataframe
+
+    # Cache of all graph already loaded
+    graph_cache: dict[str, GraphWrapper]
+    
+    # Name of the graph that we would like to work with after
+    chosen_graph_name: str
+    
+    # The original user query
+    original_query: str
+
+    # The original context of the component where this Agent was called upon
+    original_context: str
+
+    # TODO: For visualization of graph
+    visualize_request: dict[str, str]
+
+    # # topic: name of employee or name of task
+    # topic: str
+
+# --- Tool dispatch ---
+# Every tool declares the state keys it reads and writes. Tool calls of one model turn
+# that do not touch the same keys run concurrently, the others run one after another.
+NO_GRAPH_MESSAGE = "You have not chosen a graph yet, make sure to use choose_graph first!"
+GRAPH_GONE_MESSAGE = (
+    "The graph '{name}' is not in the graph cache anymore (extracted subgraphs are dropped when "
+    "the cache is full), use choose_graph again or extract the subgraph again!"
+)
+
+TOOL_HANDLERS = {}
+
+def tool_handler(name: str, reads: tuple = (), writes: tuple = ()):
+    """
+    Register the handler of tool `name`. A handler takes (state, tool_call) and returns
+    (content of the ToolMessage, dict of state updates).
+    """
+    def register(handler):
+        TOOL_HANDLERS[name] = {"handler": handler, "reads": set(reads), "writes": set(writes)}
+        return handler
+    return register
+
+def _chosen_graph(state: AgentState):
+    return state["graph_cache"].get(state["chosen_graph_name"], None)
+
+def _missing_graph_message(state: AgentState):
+    if state["chosen_graph_name"]:
+        return GRAPH_GONE_MESSAGE.format(name=state["chosen_graph_name"])
+    return NO_GRAPH_MESSAGE
+
+def _choose(state: AgentState, graph_name: str):
+    # The graph the agent works on is never evicted from the session's graph cache
+    if hasattr(state["graph_cache"], "choose"):
+        state["graph_cache"].choose(graph_name)
+    return {"chosen_graph_name": graph_name}
+
+@tool_handler("choose_graph", reads=("graph_cache", "chosen_graph_name"), writes=("chosen_graph_name",))
+def _choose_graph(state: AgentState, tool_call):
+    graph_name, reason = choose_graph.invoke(
+        input= {
+            "graph_cache": state["graph_cache"],
+            "query": state["original_query"],
+            "context": state["original_context"],
+            "other_instruction": tool_call["args"].get("other_instruction", ""),
+            "last_graph_name": state["chosen_graph_name"],
+        }
+    )
+    return f"Graph '{graph_name}' has been chosen with reason '{reason}'", _choose(state, graph_name)
+
+@tool_handler("visualize_graph", reads=("graph_cache", "chosen_graph_name"), writes=("visualize_request",))
+def _visualize_graph(state: AgentState, tool_call):
+    graph_wrapper = _chosen_graph(state)
+    print("chosen graph name", state["chosen_graph_name"])
+    if not graph_wrapper:
+        return _missing_graph_message(state), {}
+
+    graph_viz_request, message = visualize_graph.invoke(input={
+        "graph_wrapper": graph_wrapper,
+        "query": state["original_query"],
+        "context": state["original_context"],
+        "other_instruction": tool_call["args"].get("other_instruction", ""),
+    })
+    return message, {"visualize_request": graph_viz_request}
+
+@tool_handler("create_cpm_table", reads=("graph_cache", "chosen_graph_name"), writes=("df",))
+def _create_cpm_table(state: AgentState, tool_call):
+    graph_wrapper = _chosen_graph(state)
+    # No proceed if no graph chosen
+    if not graph_wrapper:
+        return _missing_graph_message(state), {}
+
+    tool_result = create_cpm_table.invoke({
+        "G_adb": graph_wrapper.graph,
+        "changed_tasks": tool_call["args"].get("changed_tasks", None),
+    })
+    return "created cpm table and can now ask cpm questions on this table", {"df": tool_result}
+
+@tool_handler("create_pert_table", reads=("graph_cache", "chosen_graph_name"), writes=("df",))
+def _create_pert_table(state: AgentState, tool_call):
+    graph_wrapper = _chosen_graph(state)
+    # No proceed if no graph chosen
+    if not graph_wrapper:
+        return _missing_graph_message(state), {}
+
+    tool_result = create_pert_table.invoke({
+        "G_adb": graph_wrapper.graph,
+        "trials": tool_call["args"].get("trials", 10000),
+        "distribution": tool_call["args"].get("distribution", "triangular"),
+    })
+    percentiles = tool_result.attrs["project_completion_percentiles"]
+    return (
+        f"created PERT table with the criticality probability of each task, can now ask cpm questions on this table. Project completion time percentiles: {percentiles}",
+        {"df": tool_result},
+    )
+
+@tool_handler("ask_cpm_question", reads=("df",))
+def _ask_cpm_question(state: AgentState, tool_call):
+    return ask_cpm_question.invoke({"df": state["df"],
+                                    "question": tool_call["args"],
+                                    "context": state["original_context"]}), {}
+
+@tool_handler("create_hits_table", reads=("graph_cache", "chosen_graph_name"), writes=("df",))
+def _create_hits_table(state: AgentState, tool_call):
+    graph_wrapper = _chosen_graph(state)
+    if not graph_wrapper:
+        return _missing_graph_message(state), {}
+
+    tool_result = create_hits_table.invoke({"G_adb": graph_wrapper.graph})
+    return "created hits table", {"df": tool_result}
+
+@tool_handler("create_team_hits_table", reads=("graph_cache",), writes=("df",))
+def _create_team_hits_table(state: AgentState, tool_call):
+    # Always ranks on the full company graph, whatever graph was chosen
+    graph_wrapper = state["graph_cache"]["employee_interaction"]
+    if graph_wrapper.graph is None:
+        graph_wrapper.load_graph()
+
+    tool_result = create_team_hits_table.invoke({"G_adb": graph_wrapper.graph})
+    return "created hits table for every team and the whole company (team '*')", {"df": tool_result}
+
+@tool_handler("ask_hits_question", reads=("df",))
+def _ask_hits_question(state: AgentState, tool_call):
+    return ask_hits_question.invoke({"df": state["df"],
+                                     "question": tool_call["args"],
+                                     "context": state["original_context"]}), {}
+
+@tool_handler("extract_subgraph", reads=("graph_cache", "chosen_graph_name"), writes=("graph_cache", "chosen_graph_name"))
+def _extract_subgraph(state: AgentState, tool_call):
+    graph_wrapper = _chosen_graph(state)
+    # No proceed if no graph chosen
+    if not graph_wrapper:
+        return _missing_graph_message(state), {}
+
+    subgraph_wrapper, message = extract_subgraph.invoke(input={
+        "graph_wrapper": graph_wrapper,
+        "query": state["original_query"],
+        "context": state["original_context"],
+        "other_instruction": tool_call["args"].get("other_instruction", "")
+    })
+    if not subgraph_wrapper:
+        return message, {}
+
+    print("Succesfully extracted", subgraph_wrapper)
+    state["graph_cache"][subgraph_wrapper.name] = subgraph_wrapper
+    return message, _choose(state, subgraph_wrapper.name)
+
+@tool_handler("text_to_aql_to_text")
+def _text_to_aql_to_text(state: AgentState, tool_call):
+    return text_to_aql_to_text.invoke(input={
+        "query": state["original_query"],
+        "context": state["original_context"],
+        "other_instruction": tool_call["args"].get("other_instruction", "")
+    }), {}
+
+@tool_handler("text_to_nx_algorithm_to_text", reads=("graph_cache", "chosen_graph_name"))
+def _text_to_nx_algorithm_to_text(state: AgentState, tool_call):
+    graph_wrapper = _chosen_graph(state)
+    # No proceed if no graph chosen
+    if not graph_wrapper:
+        return _missing_graph_message(state), {}
+
+    return text_to_nx_algorithm_to_text.invoke(input={
+        "graph_wrapper": graph_wrapper,
+        "query": state["original_query"],
+        "context": state["original_context"],
+        "other_instruction": tool_call["args"].get("other_instruction", "")
+    }), {}
+
+def _default_handler(state: AgentState, tool_call):
+    # Tools that only need their own arguments, e.g. get_weather
+    return tools_by_name[tool_call["name"]].invoke(tool_call["args"]), {}
+
+DEFAULT_TOOL = {"handler": _default_handler, "reads": set(), "writes": set()}
+
+def plan_tool_rounds(tool_calls: list[dict]):
+    """
+    Split the tool calls of one model turn into rounds, keeping their order. A call joins
+    the current round unless it reads or writes a key an earlier call of that round writes,
+    or writes a key an earlier call of that round reads.
+    """
+    rounds = []
+    reads, writes = set(), set()
+    for tool_call in tool_calls:
+        spec = TOOL_HANDLERS.get(tool_call["name"], DEFAULT_TOOL)
+        if rounds and not ((spec["reads"] | spec["writes"]) & writes or spec["writes"] & reads):
+            rounds[-1].append(tool_call)
+        else:
+            rounds.append([tool_call])
+            reads, writes = set(), set()
+        reads |= spec["reads"]
+        writes |= spec["writes"]
+    return rounds
+
+def _run_tool_call(state: AgentState, tool_call):
+    print("calling tool", tool_call["name"])
+    print("args:", tool_call["args"])
+    spec = TOOL_HANDLERS.get(tool_call["name"], DEFAULT_TOOL)
+    return spec["handler"](state, tool_call)
+
+# Define our tool node
+def tool_node(state: AgentState):
+    """Run every tool call of the last model turn, independent ones in parallel."""
+    print("Current state graph name in tool :", state["chosen_graph_name"])
+    outputs = []
+    for tool_calls in plan_tool_rounds(state["messages"][-1].tool_calls):
+        if len(tool_calls) == 1:
+            results = [_run_tool_call(state, tool_calls[0])]
+        else:
+            # Copies the context into the threads, so LLM calls inside tools still stream
+            with ContextThreadPoolExecutor(max_workers=len(tool_calls)) as pool:
+                results = list(pool.map(lambda tool_call: _run_tool_call(state, tool_call), tool_calls))
+
+        # Merge in call order, the next round sees the updates
+        for tool_call, (content, updates) in zip(tool_calls, results):
+            state.update(updates)
+            outputs.append(
+                ToolMessage(
+                    content=content,
+                    name=tool_call["name"],
+                    tool_call_id=tool_call["id"],
+                )
+            )
+
+    state["messages"] = outputs
+    return state
+
+agent_system_prompt_template = env.get_template("agent_system_prompt.jinja")
+# Define the node that calls the model
+def call_model(
+        state: AgentState,
+        config: RunnableConfig,
+    ):
+
+    graph_wrapper = _chosen_graph(state)
+    graph_info = str(graph_wrapper) if graph_wrapper else ("None" if not state["chosen_graph_name"] else _missing_graph_message(state))
+
+    # Get the question 
+    system_prompt = SystemMessage(agent_system_prompt_template.render({
+        "original_query": state["original_query"],
+        "original_context": state["original_context"],
+        "graph_info": graph_info
+    }))
+
+    print(system_prompt)
+    # Get response
+    response = get_model().invoke([system_prompt] + state["messages"], config)
+    
+    # Persist state
+    state["messages"] = [response]
+    return state
+
+
+# Define the conditional edge that determines whether to continue or not
+def should_continue(state: AgentState):
+    messages = state["messages"]
+    last_message = messages[-1]
+    # If there is no function call, then we finish
+    if not last_message.tool_calls:
+        return "end"
+    # Otherwise if there is, we continue
+    else:
+        return "continue"
+
+def create_new_agent():
+    # Define a new graph
+    workflow = StateGraph(AgentState)
+
+    # Define the two nodes we will cycle between
+    workflow.add_node("agent", call_model)
+    workflow.add_node("tools", tool_node)
+
+    # Set the entrypoint as `agent`
+    # This means that this node is the first one called
+    workflow.set_entry_point("agent")
+
+    # We now add a conditional edge
+    workflow.add_conditional_edges(
+        "agent",
+        should_continue,
+        {
+            "continue": "tools",
+            "end": END,
+        },
+    )
+
+    # We now add a normal edge from `tools` to `agent`.
+    # This means that after `tools` is called, `agent` node is called next.
+    workflow.add_edge("tools", "agent")
+
+    # Now we can compile and visualize our graph
+    graph = workflow.compile()
+    
+    return graph
+
+@st.cache_resource
+def get_agent():
+    """
+    The compiled agent, built once per process and shared by every chat widget and session.
+    It holds no per-conversation data: messages, graph cache and chosen graph all
+    come in with the input state of each run.
+    """
+    return create_new_agent()
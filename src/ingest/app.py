@@ -1,16 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 import streamlit as st
 
-from agent.graph_visualization import GraphVisualizationRequest
+from clients import print_startup_report, timed
+
+if TYPE_CHECKING:
+    from agent.graph_visualization import GraphVisualizationRequest
 # --- Page Layout ---
 st.set_page_config(layout="wide")  # Set to full-screen mode
 
-import database as db
-import graph as graph_utils
-from database import db as adb
-from agent.graph_cache import GraphWrapper
+with timed("database and graph modules import"):
+    import database as db
+    import graph as graph_utils
+    import graph_lod
+    from graph_store import load_shared_graph
+    from database import db as adb
+    from agent.graph_cache import GraphCache, GraphWrapper, DEFAULT_GRAPH_CACHE_BUDGET_BYTES
 
-from component import *
-from st_link_analysis import st_link_analysis
+with timed("UI components import"):
+    from component import *
+    from st_link_analysis import st_link_analysis
 
 PROJECT_TO_TEAM_MAP = {
     "StreamSync Pipeline": "Business Intelligence",
@@ -40,6 +49,13 @@ PROJECT_LIST = ["StreamSync Pipeline", "DataForge ETL", "AetherFlow Orchestrator
 
 GRAPH_LIST = ["Employee Interaction", "Task Dependence", "Task Assignment"]
 
+# How nodes are grouped into super-nodes when a graph is over the element budget
+GROUP_BY_GRAPH_CHOICE = {
+    "Employee Interaction": graph_lod.group_by_team_seniority,
+    "Task Dependence": graph_lod.group_by_component,
+    "Task Assignment": graph_lod.group_by_team_seniority,
+}
+
 # --- Initialize session state ---
 # Load project choice
 if "project_choice" not in st.session_state:
@@ -47,8 +63,11 @@ if "project_choice" not in st.session_state:
 project_choice = st.session_state.project_choice
 
 # Load graph cache for Agents
+# The wrappers are per session, the graphs they point to are shared read-only across sessions
 if "GRAPH_CACHE" not in st.session_state:
-    GRAPH_CACHE = {}
+    GRAPH_CACHE = GraphCache(
+        budget_bytes=int(st.secrets.get("GRAPH_CACHE_BUDGET_MB", DEFAULT_GRAPH_CACHE_BUDGET_BYTES // 2**20)) * 2**20
+    )
 
     # Preload name, schema, and description for task dependence graph
     for project in PROJECT_TO_TASKS_MAP:
@@ -74,10 +93,12 @@ if "GRAPH_CACHE" not in st.session_state:
             "edges": ["interacts with"],
         }
         description = "The graph of extended interaction and help between employees of the company"
+        # Team slices are not ArangoDB graphs of their own, so they reload through the team query
+        loader = lambda team=team: db.get_employee_interact_graph(team)
         if team == "*":
-            GRAPH_CACHE["employee_interaction"] = GraphWrapper(adb, None, "employee_interaction", schema, description)
+            GRAPH_CACHE["employee_interaction"] = GraphWrapper(adb, None, "employee_interaction", schema, description, loader)
         else:
-            GRAPH_CACHE[f"{team}_employee_interaction"] = GraphWrapper(adb, None, f"{team}_employee_interaction", schema, description)
+            GRAPH_CACHE[f"{team}_employee_interaction"] = GraphWrapper(adb, None, f"{team}_employee_interaction", schema, description, loader)
     
     # Preload task assignment graph
     schema = {
@@ -95,59 +116,78 @@ GRAPH_CACHE: dict[str, GraphWrapper] = st.session_state.GRAPH_CACHE
 if "all_project_data" not in st.session_state:
     st.session_state.all_project_data = {}
 
-# Preload all graphs related to this project
-if project_choice not in st.session_state.all_project_data:
-    team = PROJECT_TO_TEAM_MAP[project_choice]
-    team_tasks = PROJECT_TO_TASKS_MAP[project_choice]
-
-    # Retrieve collections
-    emp_col = None
-    with st.spinner(f"Retrieving {project_choice}'s List of Employees"):
-        emp_col = db.get_all_employees_by_team(team)
+def load_project_data(project):
+    """
+    Load the collections and graphs of `project`. The five loads are independent
+    I/O and run concurrently. Does not touch the session state, so it can also run
+    in a background prefetch thread.
+    """
+    team = PROJECT_TO_TEAM_MAP[project]
+    team_tasks = PROJECT_TO_TASKS_MAP[project]
+    interaction_name = "employee_interaction" if team == "*" else f"{team}_employee_interaction"
 
-    tasks_col = None
-    with st.spinner(f"Retrieving {project_choice}'s List of Tasks"):
-        tasks_col = db.get_all_tasks(team_tasks)
-
-    # Retrieve graphs
     task_assignment = None
-    if team != "*":
-        with st.spinner(f"Retrieving {project_choice}'s Task Assignment"):
-            task_assignment = db.get_task_assignment(team_tasks)
-            GRAPH_CACHE["bi_team_task_assignment"].graph = task_assignment
-        
-    employee_interaction = None
-    with st.spinner(f"Retrieving {project_choice}'s Employee Interaction"):
-        employee_interaction = db.get_employee_interact_graph(team)
-        if team == "*":
-            GRAPH_CACHE["employee_interaction"].graph = employee_interaction
-        else:
-            GRAPH_CACHE[f"{team}_employee_interaction"].graph = employee_interaction
-
     task_dependence = None
-    if team != "*":
-        with st.spinner(f"Retrieving {project_choice}'s Task Depenence"):
-            task_dependence = db.get_task_dependence_graph(team_tasks)
-            GRAPH_CACHE[f"{team_tasks}_dependence_graph"].graph = task_dependence
-    
-    # Set data
-    st.session_state.all_project_data[project_choice] = {
+    with ThreadPoolExecutor(max_workers=5, thread_name_prefix=f"load-{team_tasks}") as pool:
+        # Retrieve collections
+        emp_col = pool.submit(db.get_all_employees_by_team, team)
+        tasks_col = pool.submit(db.get_all_tasks, team_tasks)
+
+        # Retrieve graphs
+        employee_interaction = pool.submit(load_shared_graph, interaction_name, lambda: db.get_employee_interact_graph(team))
+        if team != "*":
+            task_assignment = pool.submit(load_shared_graph, "bi_team_task_assignment", lambda: db.get_task_assignment(team_tasks))
+            task_dependence = pool.submit(load_shared_graph, f"{team_tasks}_dependence_graph", lambda: db.get_task_dependence_graph(team_tasks))
+
+    return {
         "Task Assignment": {
-            "graph": task_assignment,
+            "graph": task_assignment.result() if task_assignment else None,
             "render": db.retrieve_bi_team_task_assignment_graph
         },
         "Employee Interaction": {
-            "graph": employee_interaction,
+            "graph": employee_interaction.result(),
             "render": db.retrieve_employee_interaction_graph
         },
         "Task Dependence": {
-            "graph": task_dependence,
+            "graph": task_dependence.result() if task_dependence else None,
             "render": db.retrieve_task_dependence_graph,
         },
-        "collection/Tasks": tasks_col,
-        "collection/Employees": emp_col,
+        "collection/Tasks": tasks_col.result(),
+        "collection/Employees": emp_col.result(),
     }
 
+@st.cache_resource
+def get_prefetch_pool():
+    # Shared by every session, a couple of workers is enough for background I/O
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="project-prefetch")
+
+# Background loads of the projects not opened yet
+if "project_prefetch" not in st.session_state:
+    st.session_state.project_prefetch = {}
+
+# Preload all graphs related to this project
+if project_choice not in st.session_state.all_project_data:
+    with st.spinner(f"Retrieving {project_choice}'s Employees, Tasks and Graphs"):
+        project_data = None
+        prefetch = st.session_state.project_prefetch.pop(project_choice, None)
+        if prefetch is not None:
+            try:
+                project_data = prefetch.result()
+            except Exception as e:
+                print(f"Prefetch of {project_choice} failed, loading it again: {e}")
+        if project_data is None:
+            with timed(f"{project_choice} data load"):
+                project_data = load_project_data(project_choice)
+
+    # Hand the graphs to the agents' cache, on the main thread only
+    for graph_choice in GRAPH_LIST:
+        graph = project_data[graph_choice]["graph"]
+        if graph is not None:
+            GRAPH_CACHE[graph.name].graph = graph
+
+    # Set data
+    st.session_state.all_project_data[project_choice] = project_data
+
 
 # Retrieving data
 cur_project_data = st.session_state.all_project_data[project_choice]
@@ -183,6 +223,45 @@ if project_choice != st.session_state.project_choice:
     st.session_state.project_choice = project_choice
     st.rerun()
 
+def show_graph(graph, graph_choice, lod_id, elements, layout_options, node_styles, edge_styles):
+    """
+    Render a graph with st_link_analysis, collapsed into super-nodes when it is over the
+    element budget. Double-clicking a super-node expands its group.
+    """
+    expanded_key = f"{lod_id}/expanded"
+    elements, collapsed = graph_lod.level_of_detail(
+        elements,
+        GROUP_BY_GRAPH_CHOICE[graph_choice],
+        st.session_state.get(expanded_key, set()),
+        cache_key=(graph.name, db.element_cache_revision(graph), graph_choice),
+    )
+    if not collapsed:
+        st_link_analysis(elements, layout_options, node_styles, edge_styles)
+        return
+
+    caption_col, button_col = st.columns([4, 1])
+    with caption_col:
+        st.caption(
+            f"Large graph: showing {len(elements['nodes'])} nodes and {len(elements['edges'])} edges, "
+            "with groups collapsed. Double-click a group to expand it."
+        )
+    with button_col:
+        if st.session_state.get(expanded_key) and st.button("Collapse all", key=f"{lod_id}/collapse"):
+            st.session_state[expanded_key] = set()
+            st.rerun()
+
+    # Preset layouts only place the original nodes, let the browser lay out the (small) collapsed graph
+    component_key = f"{lod_id}/events"
+    st_link_analysis(
+        elements,
+        "cose",
+        node_styles + [graph_lod.GROUP_NODE_STYLE],
+        edge_styles,
+        key=component_key,
+        on_change=graph_lod.expand_group_callback(component_key, expanded_key),
+        node_actions=["expand"],
+    )
+
 def render_graph(project_choice, graph_choice, graph_view):
     # Do not support tasks-related graph for Company Overview
     st.markdown(f"### {graph_choice} Network")
@@ -196,7 +275,7 @@ def render_graph(project_choice, graph_choice, graph_view):
 
     # Initialize specific request_visualize function
     viz_request_id = f"{project_choice}/magic_view/{graph_choice}/viz_request"
-    def request_visualize(visualize_request: GraphVisualizationRequest):
+    def request_visualize(visualize_request: "GraphVisualizationRequest"):
         # Just to be sure
         if visualize_request == None:
             raise ValueError("Can't visualize a null visualization request")
@@ -221,7 +300,7 @@ def render_graph(project_choice, graph_choice, graph_view):
                     st.markdown("#### Default layout")
                     elements, node_styles, edge_styles = render_function(graph)
                     layout_options = "grid"
-                    st_link_analysis(elements, layout_options, node_styles, edge_styles)
+                    show_graph(graph, graph_choice, f"{project_choice}/magic_view/{graph_choice}", elements, layout_options, node_styles, edge_styles)
             with magic_col:
                 magic_view_chatbot(GRAPH_CACHE[graph.name], f"{project_choice}/magic_view/{graph_choice}", request_visualize)
 
@@ -246,7 +325,7 @@ def render_graph(project_choice, graph_choice, graph_view):
         # Task Dependence
         elif graph_choice == GRAPH_LIST[1]:
             if graph_view == graph_view_by_choice[0]:
-                layout_options = "grid"
+                layout_options = graph_utils.topo_sort_layered_layout(graph.name)
             elif graph_view == graph_view_by_choice[1]:
                 layout_options = "grid"
         
@@ -255,7 +334,7 @@ def render_graph(project_choice, graph_choice, graph_view):
             layout_options = "cose"
         
         # Finally, render it out to frontend
-        st_link_analysis(elements, layout_options, node_styles, edge_styles)
+        show_graph(graph, graph_choice, f"{project_choice}/{graph_choice}", elements, layout_options, node_styles, edge_styles)
         return graph.name
 
 
@@ -272,8 +351,8 @@ with graph_view_col:
 
 current_graph_name = render_graph(project_choice, main_graph_choice, main_graph_view)
 
-if current_graph_name != None:
-    accordion_graph_chatbot(GRAPH_CACHE[current_graph_name], f"{project_choice}/magic_ask/{main_graph_choice}")
+# Filled at the end of the script: opening the chat runs the agent, the rest of the page should not wait on it
+graph_chatbot_slot = st.container()
 
 # Project Overview Section
 st.markdown("### Overview")
@@ -318,4 +397,19 @@ with task_col:
     with container:
         # Create a div with a scrollable class
         for taskID in task_info_dict:
-            task_tile(task_info_dict[taskID])
\ No newline at end of file
+            task_tile(task_info_dict[taskID])
+
+# Now that this project is on screen, start loading the other projects in the background
+for project in PROJECT_LIST:
+    if project not in st.session_state.all_project_data and project not in st.session_state.project_prefetch:
+        st.session_state.project_prefetch[project] = get_prefetch_pool().submit(load_project_data, project)
+
+print_startup_report()
+
+# Sample the database schema for the agent's prompts in the background, before the first question needs it
+from agent.schema_store import get_schema_store
+get_schema_store().refresh_in_background()
+
+if current_graph_name != None:
+    with graph_chatbot_slot:
+        accordion_graph_chatbot(GRAPH_CACHE[current_graph_name], f"{project_choice}/magic_ask/{main_graph_choice}")
@@ -1,11 +1,5 @@
 import os
 import streamlit as st
-import networkx as nx
-import pandas as pd
-import nx_arangodb as nxadb
-import re
-
-from agent import create_new_agent
 
 os.environ["LANGSMITH_TRACING"] = st.secrets["LANGSMITH_TRACING"]
 os.environ["LANGSMITH_ENDPOINT"] = st.secrets["LANGSMITH_ENDPOINT"]
@@ -13,14 +7,7 @@ os.environ["LANGSMITH_API_KEY"] = st.secrets["LANGSMITH_API_KEY"]
 os.environ["LANGSMITH_PROJECT"] = st.secrets["LANGSMITH_PROJECT"]
 os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
 
-from langchain_openai import ChatOpenAI
 from langchain_core.messages.ai import AIMessageChunk
-from typing import Literal
-from langgraph.prebuilt import create_react_agent
-from langchain_core.tools import tool
-from arango import ArangoClient
-from langchain_openai import ChatOpenAI
-from langchain_community.graphs import ArangoGraph
 from langchain_core.messages import HumanMessage, SystemMessage, BaseMessage, ToolMessage 
 
 DEFAULT_CHAT_AVATAR_MAP = {
@@ -42,10 +29,23 @@ class ChatInstance:
             ]
         self.chatbot_id = chatbot_id
         self.context = context
-        self.agent = create_new_agent()
         self.current_state = None
         self.request_visualize = request_visualize
-        self.chosen_graph_name = None
+
+    @property
+    def chosen_graph_name(self):
+        # The instance is rebuilt on every rerun, the last chosen graph lives in the session
+        return st.session_state.get(f"{self.chatbot_id}/chosen_graph_name")
+
+    @chosen_graph_name.setter
+    def chosen_graph_name(self, graph_name):
+        st.session_state[f"{self.chatbot_id}/chosen_graph_name"] = graph_name
+
+    @property
+    def agent(self):
+        # The agent workflow and its clients are only loaded once a chat actually runs
+        from agent import get_agent
+        return get_agent()
 
     def get_messages(self) -> list[BaseMessage]:
         return st.session_state[self.chatbot_id]
@@ -0,0 +1,70 @@
+"""
+Shared, lazily created clients and the startup import-time report.
+
+Nothing here imports a client library or opens a connection at import time: the
+LLM clients are created on first use and then shared by every session, so the
+first paint of the dashboard does not wait on clients the page may never need.
+
+`timed` blocks (import groups of app.py, first data loads, lazy clients) are
+collected into a report printed once per process after the first page paint.
+Blocks that run after the report are printed on their own when they are slow.
+For a per-module breakdown, run `python -X importtime -m streamlit run app.py`.
+"""
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+# Blocks running after the report are only printed from this duration on
+LATE_REPORT_THRESHOLD_S = 0.05
+
+_TIMINGS = []  # (label, seconds, modules imported)
+_TIMINGS_LOCK = threading.Lock()
+_REPORTED = False
+
+
+@contextmanager
+def timed(label: str):
+    """Time a block, with the number of modules it imported, for the startup report."""
+    modules = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        imported = max(len(sys.modules) - modules, 0)
+        with _TIMINGS_LOCK:
+            if not _REPORTED:
+                _TIMINGS.append((label, seconds, imported))
+                return
+        if seconds >= LATE_REPORT_THRESHOLD_S:
+            print(f"[startup] {label}: {seconds:.2f}s, {imported} modules (after first paint)")
+
+
+def print_startup_report():
+    """Print where the time before the first page paint went, once per process."""
+    global _REPORTED
+    with _TIMINGS_LOCK:
+        if _REPORTED:
+            return
+        _REPORTED = True
+        timings = list(_TIMINGS)
+
+    width = max((len(label) for label, _, _ in timings), default=0)
+    lines = [f"  {label:<{width}}  {seconds:6.2f}s  {imported:5d} modules" for label, seconds, imported in timings]
+    total = sum(seconds for _, seconds, _ in timings)
+    print("\n".join([f"[startup] First page paint, {total:.2f}s in timed blocks:"] + lines))
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm(temperature: float = 0.7, model_name: str = "gpt-4o"):
+    """
+    The shared ChatOpenAI client for a model and temperature.
+    langchain_openai is imported and the client (with its connection pool) created on first use.
+    """
+    with timed(f"LLM client {model_name} (temperature={temperature})"):
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(temperature=temperature, model_name=model_name, api_key=st.secrets["OPENAI_API_KEY"])
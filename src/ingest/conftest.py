@@ -0,0 +1,13 @@
+import os
+import sys
+
+import streamlit.config
+
+# The dashboard modules import each other from this directory and read files relative to it
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+os.chdir(HERE)
+
+# Modules reading st.secrets at import time get the template values when there are no real secrets
+if not os.path.exists(os.path.join(HERE, ".streamlit", "secrets.toml")):
+    streamlit.config.set_option("secrets.files", [os.path.join(HERE, ".streamlit", "secrets.template.toml")])
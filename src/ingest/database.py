@@ -1,8 +1,13 @@
-import nx_arangodb as nxadb
+from functools import wraps
+
+import networkx as nx
 import streamlit as st
 
 from st_link_analysis import NodeStyle, EdgeStyle
 from arango import ArangoClient
+from arango.exceptions import IndexCreateError, IndexListError
+
+from graph_hash import graph_content_hash
 
 client = ArangoClient(hosts=st.secrets["DATABASE_HOST"])
 db = client.db(
@@ -19,114 +24,220 @@ TASKS_TO_PROJECT_MAP = {
     "*": "Company Overview"
 }
 
+# Projection of an employee document, done server-side.
+# Missing attributes come back as null, like dict.get() did.
+EMPLOYEE_PROJECTION = """
+{
+    EmpID: e._key,
+    FirstName: e.FirstName,
+    LastName: e.LastName,
+    Email: e.Email,
+    Role: e.Role,
+    Department: e.Department,
+    Team: e.Team,
+    Seniority: e.Seniority,
+    HireDate: e.HireDate,
+    Salary: e.Salary,
+    ManagerID: e.ManagerID
+}
+"""
+
+# Bind-variable queries, so ArangoDB can reuse the cached plan for every team
+EMPLOYEES_BY_TEAM_QUERY = f"""
+FOR e IN employee
+    FILTER e.Team == @team
+    RETURN {EMPLOYEE_PROJECTION}
+"""
+
+ALL_EMPLOYEES_QUERY = f"""
+FOR e IN employee
+    RETURN {EMPLOYEE_PROJECTION}
+"""
+
+@st.cache_resource
+def ensure_employee_team_index():
+    """
+    Create the persistent index on employee.Team if it does not exist yet (checked once per process).
+    Without the permission to list or create indexes (e.g. a read-only user), the team
+    queries still run, only as collection scans.
+    """
+    employee_collection = db.collection("employee")
+    try:
+        for index in employee_collection.indexes():
+            if index["type"] == "persistent" and list(index["fields"]) == ["Team"]:
+                return
+        employee_collection.add_index({"type": "persistent", "fields": ["Team"], "name": "idx_employee_team"})
+    except (IndexListError, IndexCreateError) as e:
+        print(f"Could not create the employee.Team index, team queries will scan the collection: {e}")
+
 # Function to get all employee information as a dictionary with EmpID as the key
-def get_all_employees_by_team(team_name):
-    # Access the employee vertex collection
-    # employee_collection = db.collection('employee')  # Ensure this is the correct collection name
+def get_all_employees_by_team(team_name, batch_size=500):
     if team_name != "*":
-        employee_query = f"""
-        FOR e IN employee
-            FILTER e.Team == '{team_name}'
-            RETURN e
-        """
+        ensure_employee_team_index()
+        employees = db.aql.execute(
+            EMPLOYEES_BY_TEAM_QUERY,
+            bind_vars={"team": team_name},
+            batch_size=batch_size,
+            stream=True,
+        )
     else:
-        employee_query = f"""
-        FOR e IN employee
-            RETURN e
-        """
-    # Fetch all employees from the collection
-    employees = db.aql.execute(employee_query)  # Fetches all documents in the collection
-    
-    # Create a dictionary to store employee info with EmpID as the key
-    employee_dict = {}
-    
-    for employee in employees:
-        # Build employee info dictionary
-        employee_info = {
-            "EmpID": employee["_key"],
-            "FirstName": employee.get("FirstName"),
-            "LastName": employee.get("LastName"),
-            "Email": employee.get("Email"),
-            "Role": employee.get("Role"),
-            "Department": employee.get("Department"),
-            "Team": employee.get("Team"),
-            "Seniority": employee.get("Seniority"),
-            "HireDate": employee.get("HireDate"),
-            "Salary": employee.get("Salary"),
-            "ManagerID": employee.get("ManagerID")
-        }
-        # Use EmpID as the key
-        employee_dict[f"employee/{employee['_key']}"] = employee_info
-    
-    return employee_dict
+        employees = db.aql.execute(ALL_EMPLOYEES_QUERY, batch_size=batch_size, stream=True)
+
+    # Use EmpID as the key
+    return {f"employee/{employee['EmpID']}": employee for employee in employees}
+
+# Projection of a task document, split and labelled server-side.
+# `@@col{i}` / `@project{i}` are bound per tasks collection.
+TASK_PROJECTION = """
+(FOR t IN @@col{i}
+    RETURN {{
+        TaskID: t._key,
+        Description: t.Description,
+        AssignedEmployees: SPLIT(t.AssignedEmployees || "", ","),
+        Advisors: SPLIT(t.Advisors || "", ","),
+        PrecedingTasks: t.PrecedingTasks,
+        StoryPoints: t.StoryPoints,
+        StartTime: t.StartTime,
+        EstimatedFinishTime: t.EstimatedFinishTime,
+        Status: t.Status,
+        ActualFinishTime: t.ActualFinishTime,
+        Project: @project{i}
+    }})
+"""
+
+def build_tasks_query(tasks_cols):
+    """Build one AQL query (and its bind variables) returning the tasks of every given collection."""
+    subqueries = []
+    bind_vars = {}
+    for i, collection in enumerate(tasks_cols):
+        subqueries.append(TASK_PROJECTION.format(i=i))
+        bind_vars[f"@col{i}"] = collection
+        bind_vars[f"project{i}"] = TASKS_TO_PROJECT_MAP[collection]
+
+    tasks = subqueries[0] if len(subqueries) == 1 else f"UNION({', '.join(subqueries)})"
+    return f"FOR task IN {tasks} RETURN task", bind_vars
 
 # Function to get all task information as a dictionary with as TaskID the key
-def get_all_tasks(tasks_col):
+def get_all_tasks(tasks_col, batch_size=500):
     if tasks_col == "*":
-        collections = db.aql.execute("FOR c IN COLLECTIONS() FILTER c.name LIKE '%_tasks' RETURN c.name")
-        # Retrieve and flatten documents into one list
-        tasks = [
-            {**doc, "_collection": collection}  # Add collection name as metadata if needed
-            for collection in collections
-            for doc in db.collection(collection).all()
-        ]
+        tasks_cols = [c for c in TASKS_TO_PROJECT_MAP if c != "*"]
     else:
-        task_collection = db.collection(tasks_col)  # Ensure this is the correct collection name
-        tasks = task_collection.all()  # Fetches all documents in the collection
-    
-    # Create a dictionary to store employee info with EmpID as the key
-    task_dict = {}
-    
-    for task in tasks:
-        # Build employee info dictionary
-        task_info = {
-            "TaskID": task["_key"],
-            "Description": task.get("Description"),
-            "AssignedEmployees": task.get("AssignedEmployees", "").split(","),
-            "Advisors": task.get("Advisors", "").split(","),
-            "PrecedingTasks": task.get("PrecedingTasks"), 
-            "StoryPoints": task.get("StoryPoints"),
-            "StartTime": task.get("StartTime"),
-            "EstimatedFinishTime": task.get("EstimatedFinishTime"),
-            "Status": task.get("Status"),
-            "ActualFinishTime": task.get("ActualFinishTime"),
-            "Project": TASKS_TO_PROJECT_MAP[tasks_col if tasks_col != "*" else task["_collection"]]
-        }
-        task_dict[f"task/{task['_key']}"] = task_info
-    
-    return task_dict
+        tasks_cols = [tasks_col]
+
+    # One round trip for every collection, streamed back batch by batch
+    query, bind_vars = build_tasks_query(tasks_cols)
+    tasks = db.aql.execute(query, bind_vars=bind_vars, batch_size=batch_size, stream=True)
+
+    return {f"task/{task['TaskID']}": task for task in tasks}
+
+# Team vertices and the interaction edges between them, filtered inside ArangoDB
+TEAM_INTERACTION_QUERY = """
+LET members = (
+    FOR e IN employee
+        FILTER e.Team == @team
+        RETURN e
+)
+LET interactions = (
+    FOR e IN members
+        FOR other, edge IN 1..1 OUTBOUND e GRAPH @graph
+            FILTER other.Team == @team
+            RETURN edge
+)
+RETURN { members, interactions }
+"""
 
 def get_employee_interact_graph(team):
-    full_graph = nxadb.Graph(name="employee_interaction")
     if team == "*":
-        return full_graph
-    print(full_graph)
-    filtered_nodes = {n for n, data in full_graph.nodes(data=True) if data["Team"] == team}
-    team_graph = full_graph.copy().subgraph(filtered_nodes)
-    team_graph.name = f"{team}_employee_interaction"
+        import nx_arangodb as nxadb
+        return nxadb.Graph(name="employee_interaction")
+
+    # Only transfer this team's slice instead of loading and copying the whole company graph
+    cursor = db.aql.execute(
+        TEAM_INTERACTION_QUERY,
+        bind_vars={"team": team, "graph": "employee_interaction"},
+    )
+    result = next(cursor)
+
+    team_graph = nx.Graph(name=f"{team}_employee_interaction")
+    team_graph.add_nodes_from((employee["_id"], employee) for employee in result["members"])
+    team_graph.add_edges_from((edge["_from"], edge["_to"], edge) for edge in result["interactions"])
     return team_graph
 
+@st.cache_data(ttl=30, show_spinner=False)
+def get_graph_revision(graph_name):
+    """
+    Revision stamp of a named graph: the revision ids of every collection it is built from.
+    Team interaction graphs are slices of `employee_interaction` and share its revision.
+    Cached for a few seconds so page reruns do not pay one round trip per collection.
+    """
+    if graph_name.endswith("_employee_interaction"):
+        graph_name = "employee_interaction"
+    if not db.has_graph(graph_name):
+        return None
+
+    collections = set()
+    for definition in db.graph(graph_name).edge_definitions():
+        collections.add(definition["edge_collection"])
+        collections.update(definition["from_vertex_collections"])
+        collections.update(definition["to_vertex_collections"])
+
+    return tuple(sorted((c, db.collection(c).revision()) for c in collections))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def get_collection_and_graph_names():
+    """Names of the user collections and of the named graphs of the database."""
+    collections = tuple(c["name"] for c in db.collections() if not c["system"])
+    graphs = tuple(g["name"] for g in db.graphs())
+    return collections, graphs
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_collection_revisions(collections):
+    """Revision stamp of a set of collections, cached like get_graph_revision."""
+    return tuple((c, db.collection(c).revision()) for c in sorted(collections))
+
 def get_task_dependence_graph(tasks_col):
+    import nx_arangodb as nxadb
     return nxadb.DiGraph(name=f"{tasks_col}_dependence_graph")
 
 def get_task_assignment(tasks_col):
+    import nx_arangodb as nxadb
     return nxadb.DiGraph(name="bi_team_task_assignment")
 
 
+# --- Cytoscape elements ---
+# Every element payload is built in one pass over the node and the edge view, and cached per
+# graph name, graph content and view, so a rerun that only changes a selectbox reuses it.
+# Payloads are shared by every session and must not be modified.
+
+def element_cache_revision(graph):
+    """
+    Revision a payload built from `graph` is cached under: the content of this very graph
+    object, not the current database revision, so a session still holding an older graph
+    never stores its payload under the newer revision. Hashed once per shared (frozen) graph.
+    """
+    return graph_content_hash(graph, node_attr=True, edge_attr=True)
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _cached_elements(view, graph_name, revision, _graph, _build):
+    return _build(_graph)
+
+def cached_elements(build):
+    """
+    Cache the (elements, node_styles, edge_styles) returned by `build` per graph name,
+    graph content (see element_cache_revision) and view (the builder).
+    """
+    @wraps(build)
+    def wrapper(graph):
+        return _cached_elements(build.__name__, graph.name, element_cache_revision(graph), graph, build)
+    return wrapper
+
+@cached_elements
 def retrieve_employee_interaction_graph(emp_interact_graph):
-    nodes = []
-    edges = []
-    for employee_node, employee_info in emp_interact_graph.nodes(data=True):
-        seniority = employee_info["Seniority"] 
-
-        nodes.append({
-            "data": {
-                "id": employee_node, 
-                "label": seniority,
-                "name": f"{employee_info['FirstName']} {employee_info['LastName']}",
-                **employee_info
-            }
-        })
+    nodes = [
+        {"data": {"id": node, "label": info.get("Seniority"), "name": f"{info.get('FirstName')} {info.get('LastName')}", **info}}
+        for node, info in emp_interact_graph.nodes(data=True)
+    ]
+
     # Style node & edge groups
     node_styles = [
         NodeStyle("Director", "#FF5722", "name", "person"),           # Coral
@@ -137,21 +248,12 @@ def retrieve_employee_interaction_graph(emp_interact_graph):
         NodeStyle("Junior", "#FFC107", "name", "person"), # Amber
         NodeStyle("Employee", "#9C27B0", "name", "person"),       # Purple
     ]
-    for emp_from, emp_to in emp_interact_graph.edges:
-        if (
-            emp_from == "employee/0"
-            or emp_to == "employee/0"
-        ):
-            continue
-        edges.append({
-            "data": {
-                "id": f"{emp_from}->{emp_to}",
-                "label": "Interacts",
-                "source": emp_from,
-                "target": emp_to,
-            }
-        })
-    
+    edges = [
+        {"data": {"id": f"{emp_from}->{emp_to}", "label": "Interacts", "source": emp_from, "target": emp_to}}
+        for emp_from, emp_to in emp_interact_graph.edges
+        if emp_from != "employee/0" and emp_to != "employee/0"
+    ]
+
     edge_styles = [
         EdgeStyle("Interact", caption='label', directed=True),
     ]
@@ -162,19 +264,13 @@ def retrieve_employee_interaction_graph(emp_interact_graph):
 
     return elements, node_styles, edge_styles
 
+@cached_elements
 def retrieve_task_dependence_graph(task_interact_graph):
-    nodes = []
-    edges = []
-    
-    for task_node, task_info in task_interact_graph.nodes(data=True):
-        nodes.append({
-            "data": {
-                "id": task_node, 
-                "label": task_info["Status"],
-                "name": task_info["TaskID"],
-                **task_info
-            }
-        })
+    nodes = [
+        {"data": {"id": task_node, "label": task_info.get("Status"), "name": task_info.get("TaskID"), **task_info}}
+        for task_node, task_info in task_interact_graph.nodes(data=True)
+    ]
+
     # Style node & edge groups
     node_styles = [
         NodeStyle("Planned", "#d3d3d3", "name", "folder"),           # Orange
@@ -182,16 +278,11 @@ def retrieve_task_dependence_graph(task_interact_graph):
         NodeStyle("Completed", "#2ecc71", "name", "folder"), # Blue
         NodeStyle("Blocked", "#e74c3c", "name", "folder"), # Amber
     ]
-    for task_from, task_to in task_interact_graph.edges:
-        edges.append({
-            "data": {
-                "id": f"{task_from}->{task_to}",
-                "label": "Depends On",
-                "source": task_from,
-                "target": task_to,
-            }
-        })
-    
+    edges = [
+        {"data": {"id": f"{task_from}->{task_to}", "label": "Depends On", "source": task_from, "target": task_to}}
+        for task_from, task_to in task_interact_graph.edges
+    ]
+
     edge_styles = [
         EdgeStyle("Depends On", caption='label', directed=True),
     ]
@@ -202,58 +293,38 @@ def retrieve_task_dependence_graph(task_interact_graph):
 
     return elements, node_styles, edge_styles
 
-def retrieve_bi_team_task_assignment_graph(task_graph):
-    nodes = []
-    edges = []
-
-    # Mapping task statuses to labels and colors
-    TASK_STATUS_LABEL_MAP = {
-        "Planned": "PlannedTask",
-        "In Progress": "InProgressTask",
-        "Completed": "CompletedTask",
-        "Blocked": "BlockedTask",
-    }
-    TASK_COLOR_MAP = {
-        "PlannedTask": "#d3d3d3",
-        "InProgressTask": "#f39c12",
-        "CompletedTask": "#2ecc71",
-        "BlockedTask": "#e74c3c",
-    }
-    
-    # Employee seniority color mapping
-    EMPLOYEE_COLOR_MAP = {
-        "Lead": "#FF7F3E",
-        "Senior": "#4CAF50",
-        "Mid-Level": "#2196F3",
-        "Junior": "#FFC107",
-    }
+# Mapping task statuses to labels and colors
+TASK_STATUS_LABEL_MAP = {
+    "Planned": "PlannedTask",
+    "In Progress": "InProgressTask",
+    "Completed": "CompletedTask",
+    "Blocked": "BlockedTask",
+}
+TASK_COLOR_MAP = {
+    "PlannedTask": "#d3d3d3",
+    "InProgressTask": "#f39c12",
+    "CompletedTask": "#2ecc71",
+    "BlockedTask": "#e74c3c",
+}
 
-    for node, data in task_graph.nodes(data=True):
-        if node[:4] == "task":
-            if data["Status"] == "Planned":
-                continue
-            task_label = TASK_STATUS_LABEL_MAP.get(data["Status"], "PlannedTask")
-            nodes.append({
-                "data": {
-                    "id": node, 
-                    "label": task_label,
-                    "name": data["TaskID"],
-                    **data
-                }
-            })
-        else:
-            # Only render for BI team
-            if data["Team"] != "Business Intelligence":
-                continue
-            seniority = data["Seniority"]
-            nodes.append({
-                "data": {
-                    "id": node,
-                    "label": seniority,
-                    "name": f"{data['FirstName']} {data['LastName']}",
-                    **data
-                }
-            })
+# Employee seniority color mapping
+EMPLOYEE_COLOR_MAP = {
+    "Lead": "#FF7F3E",
+    "Senior": "#4CAF50",
+    "Mid-Level": "#2196F3",
+    "Junior": "#FFC107",
+}
+
+@cached_elements
+def retrieve_bi_team_task_assignment_graph(task_graph):
+    # Tasks that are not planned, and employees of the BI team only
+    nodes = [
+        {"data": {"id": node, "label": TASK_STATUS_LABEL_MAP.get(data["Status"], "PlannedTask"), "name": data["TaskID"], **data}}
+        if node[:4] == "task" else
+        {"data": {"id": node, "label": data["Seniority"], "name": f"{data['FirstName']} {data['LastName']}", **data}}
+        for node, data in task_graph.nodes(data=True)
+        if (data["Status"] != "Planned" if node[:4] == "task" else data["Team"] == "Business Intelligence")
+    ]
 
     # Style mappings for nodes
     node_styles = [
@@ -262,15 +333,10 @@ def retrieve_bi_team_task_assignment_graph(task_graph):
         NodeStyle(seniority, EMPLOYEE_COLOR_MAP[seniority], "name", "person") for seniority in EMPLOYEE_COLOR_MAP
     ]
     # Add edges
-    for emp_from, task_to, data in task_graph.edges(data=True):
-        edges.append({
-            "data": {
-                "id": f"{emp_from}->{task_to}",
-                "label": data["relationship"],
-                "source": emp_from,
-                "target": task_to,
-            }
-        })
+    edges = [
+        {"data": {"id": f"{emp_from}->{task_to}", "label": data["relationship"], "source": emp_from, "target": task_to}}
+        for emp_from, task_to, data in task_graph.edges(data=True)
+    ]
 
     # Style mappings for edges
     edge_styles = [
@@ -1,5 +1,11 @@
 import streamlit as st
 import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from agent.cpm_engine import kahn_levels
+from graph_hash import graph_content_hash
 
 SENIORITY_LAYER_MAP = {
     "Director": 0,
@@ -10,65 +16,95 @@ SENIORITY_LAYER_MAP = {
     "Junior": 4
 }
 
-def extract_dag_subgraphs(G):
-    """Extracts all DAG subgraphs from a directed graph."""
-    dag_subgraphs = []
-    single_nodes = []
-    
-    for component in nx.weakly_connected_components(G):
-        subgraph = G.subgraph(component).copy()
-        if len(subgraph) == 1:
-            single_nodes.append(next(iter(subgraph.nodes())))
-        elif nx.is_directed_acyclic_graph(subgraph):
-            dag_subgraphs.append(subgraph)
+def _edge_arrays(G):
+    """Node list of `G` and its edges as parallel source/target index arrays."""
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.fromiter((index[x] for edge in G.edges() for x in edge), dtype=np.int64).reshape(-1, 2)
+    return nodes, edges[:, 0], edges[:, 1]
+
+def layered_dag_positions(G, layer_height=-100, horizontal_spacing=100, dag_spacing=100, single_node_spacing=-100):
+    """
+    Positions of a layered layout of every weakly connected component of `G` side by side,
+    with the single nodes in a grid after them.
+
+    All components are layered at once: one Kahn peel over the CSR of the whole graph,
+    then the coordinates are computed with array operations. Nodes on or behind a cycle
+    go to one extra layer below the rest of their component.
+
+    :param G: A directed graph (DiGraph) from NetworkX
+    :return: {node: {'x': x, 'y': y}}
+    """
+    nodes, src, dst = _edge_arrays(G)
+    n = len(nodes)
+    if n == 0:
+        return {}
+
+    # Components numbered in order of their first node, like nx.weakly_connected_components
+    adjacency = sp.csr_array((np.ones(len(src)), (src, dst)), shape=(n, n))
+    num_components, component = connected_components(adjacency, directed=True, connection="weak")
+    first_node = np.full(num_components, n)
+    np.minimum.at(first_node, component, np.arange(n))
+    rank = np.empty(num_components, dtype=np.int64)
+    rank[np.argsort(first_node)] = np.arange(num_components)
+    component = rank[component]
+    size = np.bincount(component, minlength=num_components)
+
+    level = kahn_levels(src, dst, n)
+    cyclic = level < 0
+    if cyclic.any():
+        depth = np.zeros(num_components, dtype=np.int64)
+        np.maximum.at(depth, component[~cyclic], level[~cyclic] + 1)
+        level[cyclic] = depth[component[cyclic]]
+
+    # Layered components: nodes sorted by component, then layer, then node order
+    layered = np.flatnonzero(size[component] > 1)
+    order = layered[np.lexsort((layered, level[layered], component[layered]))]
+    order_component, order_level = component[order], level[order]
 
-    return dag_subgraphs, single_nodes
+    # Rank of every node inside its layer, and the width of that layer
+    starts = np.flatnonzero(np.r_[True, (np.diff(order_component) != 0) | (np.diff(order_level) != 0)])
+    widths = np.diff(np.r_[starts, len(order)])
+    layer_width = np.repeat(widths, widths)
+    rank_in_layer = np.arange(len(order)) - np.repeat(starts, widths)
+
+    # Each component is as wide as its widest layer, the next one starts after it
+    max_width = np.zeros(num_components, dtype=np.int64)
+    np.maximum.at(max_width, order_component, layer_width)
+    advance = np.where(size > 1, max_width * horizontal_spacing + dag_spacing, 0)
+    x_offset = np.cumsum(advance) - advance
+
+    x = x_offset[order_component] + (rank_in_layer - layer_width // 2) * horizontal_spacing
+    y = order_level * layer_height
+
+    # Position single nodes in a grid
+    singles = np.flatnonzero(size[component] == 1)
+    grid_width = int(len(singles) ** 0.5) or 1  # Square-like grid
+    row, col = np.divmod(np.arange(len(singles)), grid_width)
+    single_x = int(advance.sum()) + col * single_node_spacing
+    single_y = row * single_node_spacing
+
+    positions = {nodes[i]: {'x': px, 'y': py} for i, px, py in zip(order.tolist(), x.tolist(), y.tolist())}
+    positions.update(
+        (nodes[i], {'x': px, 'y': py}) for i, px, py in zip(singles.tolist(), single_x.tolist(), single_y.tolist())
+    )
+    return positions
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _layered_dag_positions(graph_name, content_hash, _G):
+    return layered_dag_positions(_G)
 
-@st.cache_data
 def topo_sort_layered_layout(graph_name, fit=True, padding=30, spacing_factor=1, animate=False, animation_duration=500):
     """
     Converts a NetworkX directed graph into a layered layout for Cytoscape.js, 
     extracting and visualizing separate DAGs distinctly.
+    The positions are cached by graph name and content hash, a changed graph is laid out again.
     
-    :param G: A directed graph (DiGraph) from NetworkX
+    :param graph_name: Name of the directed graph (DiGraph) in the graph cache
     :return: A dictionary with Cytoscape.js layout options
     """
     G = st.session_state.GRAPH_CACHE[graph_name].graph
-    dag_subgraphs, single_nodes = extract_dag_subgraphs(G.copy())
-    positions = {}
-    
-    layer_height = -100  # Vertical spacing between layers
-    dag_x_offset = 0      # Horizontal offset for separating DAGs
-    dag_spacing = 100     # Spacing between DAGs
-    single_node_spacing = -100  # Spacing for single-node grid
-
-    # Process each DAG separately
-    for dag in dag_subgraphs:
-        layers = list(nx.topological_generations(dag))
-        
-        max_layer_width = max(len(layer) for layer in layers)  # Widest layer
-        horizontal_spacing = 100  # Spacing between nodes in the same layer
-        
-        for level, nodes in enumerate(layers):
-            vertical_position = level * layer_height
-            layer_width = len(nodes)
-            
-            for i, node in enumerate(nodes):
-                positions[node] = {
-                    'x': dag_x_offset + (i - layer_width // 2) * horizontal_spacing,
-                    'y': vertical_position
-                }
-        
-        dag_x_offset += max_layer_width * horizontal_spacing + dag_spacing  # Shift for next DAG
-
-    # Position single nodes in a grid
-    grid_width = int(len(single_nodes) ** 0.5) or 1  # Square-like grid
-    for i, node in enumerate(single_nodes):
-        row, col = divmod(i, grid_width)
-        positions[node] = {
-            'x': dag_x_offset + col * single_node_spacing,
-            'y': row * single_node_spacing
-        }
+    positions = _layered_dag_positions(graph_name, graph_content_hash(G), G)
 
     # Cytoscape.js layout options
     layout_options = {
@@ -101,18 +137,9 @@ def layered_topo_sort_by_seniority(G):
     # Here we just return the layers as is
     return [layers[i] for i in range(5) if layers[i]]
 
-@st.cache_data
-def get_layout_for_seniority_layers(graph_name):
-    """
-    Convert the layered employee graph into a layout dict for Cytoscape.js based on seniority layers.
-
-    :param G: NetworkX DiGraph representing the employee hierarchy
-    :return: Cytoscape.js layout dict with positions of nodes for visualization
-    """
-    print("seniority", graph_name)
-    G = st.session_state.GRAPH_CACHE[graph_name].graph
-    print(G)
-    layers = layered_topo_sort_by_seniority(G)  # Get employees layered by seniority
+@st.cache_data(max_entries=32, show_spinner=False)
+def _seniority_positions(graph_name, content_hash, _G):
+    layers = layered_topo_sort_by_seniority(_G)  # Get employees layered by seniority
     
     # Define the layout
     positions = {}
@@ -129,6 +156,20 @@ def get_layout_for_seniority_layers(graph_name):
                 'x': (i - (layer_width // 2)) * horizontal_spacing,
                 'y': vertical_position
             }
+    return positions
+
+def get_layout_for_seniority_layers(graph_name):
+    """
+    Convert the layered employee graph into a layout dict for Cytoscape.js based on seniority layers.
+    The positions are cached by graph name and a hash of the nodes and their seniority.
+
+    :param graph_name: Name of the employee graph in the graph cache
+    :return: Cytoscape.js layout dict with positions of nodes for visualization
+    """
+    print("seniority", graph_name)
+    G = st.session_state.GRAPH_CACHE[graph_name].graph
+    print(G)
+    positions = _seniority_positions(graph_name, graph_content_hash(G, "Seniority"), G)
     
     # Return Cytoscape layout options
     layout_options = {
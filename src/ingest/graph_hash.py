@@ -0,0 +1,35 @@
+import hashlib
+import weakref
+
+import networkx as nx
+
+# Content hashes of frozen (shared, read-only) graphs, computed once per graph object
+_FROZEN_GRAPH_HASHES = weakref.WeakKeyDictionary()
+
+
+def graph_content_hash(G, node_attr=None, edge_attr=None):
+    """
+    Hash of the nodes and edges of `G` (with their `node_attr` / `edge_attr` values),
+    so anything cached from a graph follows the graph's content rather than its name or size.
+    """
+    frozen = nx.is_frozen(G)
+    key = (node_attr, edge_attr)
+    if frozen:
+        content_hash = _FROZEN_GRAPH_HASHES.get(G, {}).get(key)
+        if content_hash is not None:
+            return content_hash
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(list(G.nodes(data=node_attr) if node_attr else G.nodes())).encode())
+    digest.update(repr(list(G.edges(data=edge_attr) if edge_attr else G.edges())).encode())
+    content_hash = digest.hexdigest()
+
+    if frozen:
+        _FROZEN_GRAPH_HASHES.setdefault(G, {})[key] = content_hash
+    return content_hash
+
+
+def node_attribute(G, nodes: list, attr: str, default=None):
+    """Read one node attribute of `G` in a single pass, aligned with `nodes`."""
+    values = dict(G.nodes(data=attr, default=default))
+    return [values.get(node, default) for node in nodes]
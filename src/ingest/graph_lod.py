@@ -0,0 +1,155 @@
+"""
+Level of detail for the dashboard graphs.
+
+Above an element budget (nodes + edges), the Cytoscape payload is collapsed: nodes are
+grouped into super-nodes (by team and seniority, or by weakly connected component for
+task DAGs) and the edges between two groups become one edge carrying their count.
+Double-clicking a super-node expands that group back into its nodes.
+"""
+import os
+from collections import Counter, defaultdict
+
+import streamlit as st
+from st_link_analysis import NodeStyle
+
+# Largest number of nodes + edges sent to the browser before the graph is collapsed
+GRAPH_ELEMENT_BUDGET = int(os.environ.get("GRAPH_ELEMENT_BUDGET", 1500))
+
+# Node ids of super-nodes start with this prefix
+GROUP_PREFIX = "group/"
+
+# Label of super-nodes whose members do not share a label
+GROUP_LABEL = "Group"
+GROUP_NODE_STYLE = NodeStyle(GROUP_LABEL, "#607D8B", "name", "group")
+
+
+def group_by_team_seniority(elements):
+    """Employees by team and seniority, other nodes (tasks) by their label."""
+    groups = {}
+    for node in elements["nodes"]:
+        data = node["data"]
+        if "Seniority" in data:
+            groups[data["id"]] = f"{data.get('Team')} · {data['Seniority']}"
+        else:
+            groups[data["id"]] = str(data.get("label"))
+    return groups
+
+
+def group_by_component(elements):
+    """Weakly connected components of the rendered nodes. Isolated nodes share one group."""
+    parent = {node["data"]["id"]: node["data"]["id"] for node in elements["nodes"]}
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for edge in elements["edges"]:
+        source, target = edge["data"]["source"], edge["data"]["target"]
+        if source in parent and target in parent:
+            parent[find(source)] = find(target)
+
+    names = {node["data"]["id"]: node["data"].get("name") for node in elements["nodes"]}
+    roots = {node: find(node) for node in parent}
+    sizes = Counter(roots.values())
+    # Name each component after its first node, in node order
+    first = {}
+    for node, root in roots.items():
+        first.setdefault(root, names[node])
+    return {
+        node: f"Component of {first[root]}" if sizes[root] > 1 else "Unconnected"
+        for node, root in roots.items()
+    }
+
+
+def _collapse(elements, groups, expanded):
+    members = defaultdict(list)
+    for node in elements["nodes"]:
+        members[groups[node["data"]["id"]]].append(node)
+
+    nodes = []
+    representative = {}
+    for group, group_nodes in members.items():
+        # Expanded groups, and groups of one node, are shown as their nodes
+        if group in expanded or len(group_nodes) == 1:
+            nodes.extend(group_nodes)
+            representative.update((node["data"]["id"], node["data"]["id"]) for node in group_nodes)
+            continue
+
+        group_id = f"{GROUP_PREFIX}{group}"
+        labels = {node["data"].get("label") for node in group_nodes}
+        nodes.append({"data": {
+            "id": group_id,
+            "label": labels.pop() if len(labels) == 1 else GROUP_LABEL,
+            "name": f"{group} ({len(group_nodes)})",
+            "group": group,
+            "size": len(group_nodes),
+        }})
+        representative.update((node["data"]["id"], group_id) for node in group_nodes)
+
+    edges = []
+    counts = Counter()
+    internal = Counter()
+    for edge in elements["edges"]:
+        data = edge["data"]
+        source, target = representative.get(data["source"]), representative.get(data["target"])
+        if source is None or target is None:
+            continue
+        if source == data["source"] and target == data["target"]:
+            edges.append(edge)
+        elif source == target:
+            internal[source] += 1
+        else:
+            counts[source, target, data["label"]] += 1
+
+    edges.extend(
+        {"data": {"id": f"{source}->{target}/{label}", "label": label, "source": source, "target": target, "count": count}}
+        for (source, target, label), count in counts.items()
+    )
+    for node in nodes:
+        if node["data"]["id"] in internal:
+            node["data"]["internal_edges"] = internal[node["data"]["id"]]
+
+    return {"nodes": nodes, "edges": edges}
+
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def _cached_collapse(cache_key, grouping, expanded, _elements, _group_by):
+    return _collapse(_elements, _group_by(_elements), expanded)
+
+
+def level_of_detail(elements, group_by, expanded=frozenset(), budget: int = GRAPH_ELEMENT_BUDGET, cache_key=None):
+    """
+    Collapse `elements` into super-nodes if they are over `budget` elements.
+
+    Args:
+        elements: Cytoscape {"nodes", "edges"} payload, not modified
+        group_by: Function returning {node id: group name} for the payload
+        expanded: Names of the groups to show as their nodes
+        budget: Largest number of nodes + edges sent as is
+        cache_key: Hashable key of the payload (e.g. graph name, revision, view) to cache the result under
+
+    Returns:
+        (elements, collapsed), `elements` itself when it fits the budget
+    """
+    if len(elements["nodes"]) + len(elements["edges"]) <= budget:
+        return elements, False
+
+    expanded = frozenset(expanded)
+    if cache_key is None:
+        return _collapse(elements, group_by(elements), expanded), True
+    return _cached_collapse(cache_key, group_by.__name__, expanded, elements, group_by), True
+
+
+def expand_group_callback(component_key, expanded_key):
+    """on_change callback of st_link_analysis: remember the super-nodes the user expanded."""
+    def callback():
+        event = st.session_state.get(component_key)
+        if not event or event.get("action") != "expand":
+            return
+        expanded = st.session_state.setdefault(expanded_key, set())
+        for node_id in event["data"]["node_ids"]:
+            if node_id.startswith(GROUP_PREFIX):
+                expanded.add(node_id[len(GROUP_PREFIX):])
+    return callback
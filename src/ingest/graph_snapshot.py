@@ -0,0 +1,219 @@
+"""
+On-disk snapshots of graphs for fast cold starts.
+
+Snapshot layout of a graph:
+    meta.json    name, directed, revision, format version
+    nodes.arrow  node-id table + one column per node attribute
+    indptr.npy   CSR row pointer over the node table (edges sorted by source)
+    edges.arrow  CSR target column + one column per edge attribute
+
+A graph reads back exactly as it was written, attribute by attribute:
+- a column holds one Arrow type only when all of its values share one scalar Python type,
+  mixed and nested values (int/float mixes, dicts, lists) are stored as JSON strings,
+  and values JSON would change (tuples, dates...) as pickles
+- explicit None values are nulls, attributes a node or edge does not have are left
+  out through a presence mask column
+"""
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+import networkx as nx
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Where graph snapshots live, one directory per graph
+SNAPSHOT_DIR = os.environ.get("GRAPH_SNAPSHOT_DIR", ".graph_snapshots")
+SNAPSHOT_FORMAT_VERSION = 2
+
+# Column holding the node ids in nodes.arrow
+NODE_ID_COLUMN = "__node_id__"
+
+# Prefix of the presence mask columns of attributes some rows do not have
+PRESENT_PREFIX = "__present__/"
+
+# Python types stored as native Arrow columns
+ARROW_SCALAR_TYPES = {bool: pa.bool_(), int: pa.int64(), float: pa.float64(), str: pa.string()}
+
+
+def _snapshot_path(name, directory=None):
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    return os.path.join(directory or SNAPSHOT_DIR, safe_name)
+
+
+def _json_round_trips(value):
+    try:
+        decoded = json.loads(json.dumps(value))
+    except (TypeError, ValueError):
+        return False
+    # == alone would accept 1 for 1.0 or True for 1
+    return decoded == value and repr(decoded) == repr(value)
+
+
+def _to_column(values):
+    """
+    Arrow column of `values` and its encoding: None for a native column, "json" or "pickle"
+    for values Arrow cannot store as one type without changing them.
+    """
+    if isinstance(values, np.ndarray):
+        return pa.array(values), None
+
+    types = {type(v) for v in values if v is not None}
+    if len(types) <= 1:
+        arrow_type = ARROW_SCALAR_TYPES.get(types.pop(), None) if types else pa.null()
+        if arrow_type is not None:
+            try:
+                return pa.array(values, arrow_type), None
+            except (pa.ArrowInvalid, OverflowError):
+                pass  # e.g. integers beyond int64
+
+    if all(v is None or _json_round_trips(v) for v in values):
+        return pa.array([None if v is None else json.dumps(v) for v in values], pa.string()), "json"
+    return pa.array([None if v is None else pickle.dumps(v) for v in values], pa.binary()), "pickle"
+
+
+def _to_table(records: list[dict], extra_columns: dict = None):
+    """
+    Columnar table of attribute dicts, every attribute key becomes a column. Keys
+    only some records have get a presence mask column next to their values.
+    """
+    keys = list(dict.fromkeys(key for record in records for key in record))
+    columns = dict(extra_columns or {})
+    for key in keys:
+        present = [key in record for record in records]
+        columns[key] = [record.get(key) for record in records]
+        if not all(present):
+            columns[f"{PRESENT_PREFIX}{key}"] = present
+
+    arrays, fields = [], []
+    for key, values in columns.items():
+        array, encoding = _to_column(values)
+        arrays.append(array)
+        fields.append(pa.field(str(key), array.type, metadata={"encoding": encoding} if encoding else None))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def _from_table(table: pa.Table):
+    """Decode a table written by _to_table into ({column: python list}, {column: presence mask})."""
+    columns, masks = {}, {}
+    for field, column in zip(table.schema, table.columns):
+        values = column.to_pylist()
+        encoding = field.metadata.get(b"encoding") if field.metadata else None
+        if encoding == b"json":
+            values = [None if v is None else json.loads(v) for v in values]
+        elif encoding == b"pickle":
+            values = [None if v is None else pickle.loads(v) for v in values]
+
+        if field.name.startswith(PRESENT_PREFIX):
+            masks[field.name[len(PRESENT_PREFIX):]] = values
+        else:
+            columns[field.name] = values
+    return columns, masks
+
+
+def _rows(columns: dict, masks: dict, length: int):
+    """Rebuild the attribute dicts, leaving out the attributes a row did not have."""
+    rows = [{} for _ in range(length)]
+    for key, values in columns.items():
+        mask = masks.get(key)
+        if mask is None:
+            for row, value in zip(rows, values):
+                row[key] = value
+        else:
+            for row, value, present in zip(rows, values, mask):
+                if present:
+                    row[key] = value
+    return rows
+
+
+def _write_table(table: pa.Table, path):
+    with pa.OSFile(path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_table(path):
+    return ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def save_snapshot(G, name, revision, directory=None):
+    """
+    Write `G` as a snapshot tagged with the collection `revision` it was loaded at.
+
+    The snapshot is written to a temporary directory and moved into place, so a
+    reader never sees a half-written snapshot.
+    """
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    node_attrs = [attrs for _, attrs in G.nodes(data=True)]
+
+    src, dst, edge_attrs = [], [], []
+    for u, v, attrs in G.edges(data=True):
+        src.append(index[u])
+        dst.append(index[v])
+        edge_attrs.append(attrs)
+
+    # CSR: edges sorted by source node
+    src = np.asarray(src, dtype=np.int64)
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(nodes)), out=indptr[1:])
+
+    path = _snapshot_path(name, directory)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    _write_table(_to_table(node_attrs, {NODE_ID_COLUMN: nodes}), os.path.join(tmp_path, "nodes.arrow"))
+    _write_table(
+        _to_table([edge_attrs[i] for i in order], {NODE_ID_COLUMN: np.asarray(dst, dtype=np.int64)[order]}),
+        os.path.join(tmp_path, "edges.arrow"),
+    )
+    np.save(os.path.join(tmp_path, "indptr.npy"), indptr)
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({
+            "name": name,
+            "directed": G.is_directed(),
+            "revision": revision,
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+        }, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(name, revision, directory=None):
+    """
+    Load the snapshot of graph `name` if it exists and was taken at `revision`.
+
+    Returns:
+        A NetworkX Graph/DiGraph, or None when there is no valid snapshot
+    """
+    path = _snapshot_path(name, directory)
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # JSON round-trips tuples as lists
+    if meta.get("format_version") != SNAPSHOT_FORMAT_VERSION or meta.get("revision") != json.loads(json.dumps(revision)):
+        print(f"Snapshot of {name} is stale, ignoring it")
+        return None
+
+    node_columns, node_masks = _from_table(_read_table(os.path.join(path, "nodes.arrow")))
+    edge_columns, edge_masks = _from_table(_read_table(os.path.join(path, "edges.arrow")))
+    indptr = np.load(os.path.join(path, "indptr.npy"))
+
+    nodes = node_columns.pop(NODE_ID_COLUMN)
+    targets = edge_columns.pop(NODE_ID_COLUMN)
+    sources = np.repeat(np.arange(len(nodes)), np.diff(indptr))
+
+    G = nx.DiGraph(name=meta["name"]) if meta["directed"] else nx.Graph(name=meta["name"])
+    G.add_nodes_from(zip(nodes, _rows(node_columns, node_masks, len(nodes))))
+    G.add_edges_from(
+        (nodes[u], nodes[v], attrs)
+        for u, v, attrs in zip(sources.tolist(), targets, _rows(edge_columns, edge_masks, len(targets)))
+    )
+    return G
@@ -0,0 +1,89 @@
+import threading
+import networkx as nx
+import streamlit as st
+
+import database as db
+from graph_snapshot import load_snapshot, save_snapshot
+
+
+class SharedGraphStore:
+    """
+    Process-wide store holding one immutable copy of every graph, keyed by
+    graph name and the revision of the collections it was loaded from.
+
+    All browser sessions share the same frozen graphs; anything a session derives
+    from them (e.g. subgraphs from `extract_subgraph`) stays in that session.
+    """
+
+    def __init__(self):
+        self._graphs = {}  # name -> (revision, frozen graph)
+        self._snapshotted = set()  # names whose current graph has an on-disk snapshot
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _lock_for(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name, loader):
+        """
+        Return the shared, read-only graph `name`, calling `loader()` only when it is
+        missing or its collections changed since it was loaded.
+        """
+        revision = db.get_graph_revision(name)
+        entry = self._graphs.get(name)
+        if entry is not None and entry[0] == revision:
+            return entry[1]
+
+        # One loader per graph at a time, other sessions wait for its result
+        with self._lock_for(name):
+            entry = self._graphs.get(name)
+            if entry is not None and entry[0] == revision:
+                return entry[1]
+
+            # An on-disk snapshot taken at the same revision is much faster to read than the database
+            graph = load_snapshot(name, revision) if revision is not None else None
+            snapshotted = graph is not None
+            if graph is None:
+                print(f"Loading shared graph {name} at revision {revision}")
+                graph = loader()
+                if revision is not None:
+                    try:
+                        save_snapshot(graph, name, revision)
+                        snapshotted = True
+                    except Exception as e:
+                        print(f"Could not snapshot {name}: {e}")
+            else:
+                print(f"Loaded shared graph {name} from its snapshot at revision {revision}")
+
+            graph = nx.freeze(graph)
+            self._graphs[name] = (revision, graph)
+            if snapshotted:
+                self._snapshotted.add(name)
+            else:
+                self._snapshotted.discard(name)
+            return graph
+
+    def snapshot_revision(self, name, graph):
+        """The revision of the on-disk snapshot of `graph`, if `graph` is the shared graph `name` and has one."""
+        entry = self._graphs.get(name)
+        if entry is None or entry[1] is not graph or name not in self._snapshotted:
+            return None
+        return entry[0]
+
+    def invalidate(self, name=None):
+        """Drop one graph (or every graph) so the next access reloads it."""
+        with self._lock:
+            if name is None:
+                self._graphs.clear()
+            else:
+                self._graphs.pop(name, None)
+
+
+@st.cache_resource
+def get_graph_store():
+    return SharedGraphStore()
+
+
+def load_shared_graph(name, loader):
+    return get_graph_store().get(name, loader)
@@ -0,0 +1,272 @@
+"""
+Process-pool executor for LLM-generated code.
+
+Generated code runs in separate worker processes with a wall-clock and a memory
+limit, so a runaway algorithm (e.g. nx.all_simple_paths on the company graph)
+only costs its own worker, which is killed and replaced, instead of freezing the
+Streamlit server for every user.
+
+Workers are spawned fresh and get graphs through the on-disk snapshots of the
+shared graph store (Arrow IPC files), keeping the last few loaded.
+Graphs without a snapshot, such as extracted subgraphs, are pickled over.
+Only the requested variables (e.g. FINAL_RESULT) are sent back, pickled.
+"""
+import hashlib
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import traceback
+from collections import OrderedDict
+
+import networkx as nx
+
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", 2))
+SANDBOX_TIMEOUT_S = float(os.environ.get("SANDBOX_TIMEOUT_S", 30))
+# How long a run waits for a free worker, on top of its own timeout
+SANDBOX_WAIT_S = float(os.environ.get("SANDBOX_WAIT_S", 60))
+SANDBOX_MEMORY_LIMIT_MB = int(os.environ.get("SANDBOX_MEMORY_LIMIT_MB", 2048))
+
+# Graphs and compiled code kept by every worker between runs
+WORKER_GRAPH_CACHE_SIZE = 4
+WORKER_CODE_CACHE_SIZE = 128
+
+
+class SandboxError(Exception):
+    """The generated code raised, or its worker died (e.g. over the memory limit)."""
+
+
+class SandboxTimeout(SandboxError):
+    """The generated code ran past its wall-clock limit and its worker was killed."""
+
+
+class SandboxUnavailable(Exception):
+    """
+    The sandbox could not run the code at all (e.g. a graph snapshot is missing).
+    Not an error of the generated code, so repairing the code does not help.
+    """
+
+
+class SandboxBusy(SandboxUnavailable):
+    """No sandbox worker became free in time, every worker is running other code."""
+
+
+# --- Worker process ---
+
+def _address_space_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _limit_memory(limit_bytes):
+    try:
+        import resource
+    except ImportError:
+        # No rlimits on this platform, only the timeout applies
+        return
+    limit = _address_space_bytes() + limit_bytes
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _lru_get(cache: OrderedDict, key, build, size):
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache[key] = value
+        while len(cache) > size:
+            cache.popitem(last=False)
+    cache.move_to_end(key)
+    return value
+
+
+def _load_graph(graph_ref, graphs: OrderedDict):
+    from graph_snapshot import load_snapshot
+
+    kind, payload = graph_ref
+    if kind == "pickle":
+        return nx.freeze(pickle.loads(payload))
+
+    name, revision = payload
+    def build():
+        graph = load_snapshot(name, revision)
+        if graph is None:
+            raise SandboxUnavailable(f"No snapshot of graph {name} at revision {revision}")
+        return nx.freeze(graph)
+    return _lru_get(graphs, (name, pickle.dumps(revision)), build, WORKER_GRAPH_CACHE_SIZE)
+
+
+def _detach(value):
+    # Only the final result is materialized: views of the worker's graph would drag
+    # the whole graph along, send a plain copy of just their nodes and edges
+    if isinstance(value, nx.Graph) and nx.is_frozen(value):
+        return value.copy()
+    return value
+
+
+def _describe_error(e: Exception, code: str):
+    """The exception plus the generated lines it went through, for the model to repair the code."""
+    lines = code.splitlines()
+    frames = [
+        f"  line {frame.lineno}: {lines[frame.lineno - 1].strip()}"
+        for frame in traceback.extract_tb(e.__traceback__)
+        if frame.filename == "<generated>" and 0 < frame.lineno <= len(lines)
+    ]
+    return "\n".join([f"{type(e).__name__}: {e}"] + frames)
+
+
+def _worker_main(conn, memory_limit_bytes):
+    _limit_memory(memory_limit_bytes)
+    graphs = OrderedDict()
+    compiled = OrderedDict()
+
+    while True:
+        try:
+            code, inputs, graph_ref, graph_var, outputs = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        try:
+            global_vars = {"nx": nx, **inputs}
+            if graph_ref is not None:
+                # Frozen: the code gets lazy subgraph views, and mutations raise instead of leaking into the next run
+                global_vars[graph_var] = _load_graph(graph_ref, graphs)
+            local_vars = {}
+
+            code_key = hashlib.sha256(code.encode()).hexdigest()
+            code_object = _lru_get(compiled, code_key, lambda: compile(code, "<generated>", "exec"), WORKER_CODE_CACHE_SIZE)
+            exec(code_object, global_vars, local_vars)
+
+            conn.send(("ok", {name: _detach(local_vars[name]) for name in outputs if name in local_vars}))
+        except SandboxUnavailable as e:
+            conn.send(("unavailable", str(e)))
+        except MemoryError:
+            graphs.clear()
+            conn.send(("error", f"MemoryError: the code went over the {memory_limit_bytes // 2**20} MB memory limit"))
+        except Exception as e:
+            conn.send(("error", _describe_error(e, code)))
+
+
+# --- Parent side ---
+
+class _Worker:
+    def __init__(self, context, memory_limit_bytes):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit_bytes), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxExecutor:
+    """
+    Pool of worker processes running generated code, one run per worker at a time.
+
+    A run that goes over `timeout` seconds has its worker killed and replaced; the
+    memory limit is an address-space rlimit set in every worker.
+    """
+
+    def __init__(self, workers: int = SANDBOX_WORKERS, timeout: float = SANDBOX_TIMEOUT_S,
+                 memory_limit_mb: int = SANDBOX_MEMORY_LIMIT_MB, wait: float = SANDBOX_WAIT_S):
+        self.timeout = timeout
+        self.wait = wait
+        self.memory_limit_bytes = memory_limit_mb * 2**20
+        # Spawned workers start from a clean interpreter, not a copy of the Streamlit server
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(_Worker(self._context, self.memory_limit_bytes))
+
+    def run(self, code: str, inputs: dict = None, graph=None, graph_var: str = "G", outputs=("FINAL_RESULT",),
+            timeout: float = None):
+        """
+        Execute `code` in a worker.
+
+        Args:
+            code: Python source, `nx` is always available to it
+            inputs: Picklable global variables for the code (e.g. {"df": df})
+            graph: Optional (graph name, graph) made available to the code, read-only, as `graph_var`
+            graph_var: Name of the graph variable in the code
+            outputs: Names of the variables to send back
+            timeout: Wall-clock limit in seconds, defaults to the executor's
+
+        Returns:
+            {name: value} of the requested output variables the code set
+
+        Raises:
+            SandboxTimeout: The code ran too long
+            SandboxError: The code raised, or its worker died
+            SandboxBusy: No worker became free within the executor's `wait`
+            SandboxUnavailable: The code could not be run, e.g. the graph snapshot is missing
+        """
+        timeout = self.timeout if timeout is None else timeout
+        graph_ref = None if graph is None else _graph_ref(*graph)
+        request = (code, inputs or {}, graph_ref, graph_var, tuple(outputs))
+
+        try:
+            worker = self._idle.get(timeout=self.wait)
+        except queue.Empty:
+            raise SandboxBusy(f"No sandbox worker became free within {self.wait:.0f}s")
+
+        try:
+            worker.conn.send(request)
+            if not worker.conn.poll(timeout):
+                worker.kill()
+                worker = _Worker(self._context, self.memory_limit_bytes)
+                raise SandboxTimeout(f"The code did not finish within {timeout:.0f}s and was stopped")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            # The worker died, e.g. killed by the OS over memory
+            worker.kill()
+            worker = _Worker(self._context, self.memory_limit_bytes)
+            raise SandboxError("The code crashed its worker process")
+        finally:
+            self._idle.put(worker)
+
+        if status == "unavailable":
+            raise SandboxUnavailable(payload)
+        if status == "error":
+            raise SandboxError(payload)
+        return payload
+
+
+def _plain_graph(G):
+    """A plain, picklable NetworkX copy of `G` (nx-arangodb graphs hold a database client)."""
+    H = nx.DiGraph() if G.is_directed() else nx.Graph()
+    H.graph["name"] = getattr(G, "name", "")
+    H.add_nodes_from(G.nodes(data=True))
+    H.add_edges_from(G.edges(data=True))
+    return H
+
+
+def _graph_ref(name, G):
+    # Shared graphs have a snapshot the workers can map, anything else is pickled over
+    from graph_store import get_graph_store
+
+    revision = get_graph_store().snapshot_revision(name, G)
+    if revision is not None:
+        return "snapshot", (name, revision)
+    return "pickle", pickle.dumps(_plain_graph(G))
+
+
+_SANDBOX = None
+_SANDBOX_LOCK = threading.Lock()
+
+
+def get_sandbox():
+    """The process-wide SandboxExecutor, started on first use."""
+    global _SANDBOX
+    with _SANDBOX_LOCK:
+        if _SANDBOX is None:
+            _SANDBOX = SandboxExecutor()
+        return _SANDBOX
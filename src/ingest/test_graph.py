@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from graph import layered_dag_positions
+
+
+def _baseline_positions(G, layer_height=-100, horizontal_spacing=100, dag_spacing=100, single_node_spacing=-100):
+    """The per-component topological_generations layout the array version replaced."""
+    positions = {}
+    dag_x_offset = 0
+    single_nodes = []
+    for component in nx.weakly_connected_components(G):
+        dag = G.subgraph(component)
+        if len(dag) == 1:
+            single_nodes.append(next(iter(dag)))
+            continue
+        layers = list(nx.topological_generations(dag))
+        for level, nodes in enumerate(layers):
+            for i, node in enumerate(nodes):
+                positions[node] = {"x": dag_x_offset + (i - len(nodes) // 2) * horizontal_spacing, "y": level * layer_height}
+        dag_x_offset += max(len(layer) for layer in layers) * horizontal_spacing + dag_spacing
+
+    grid_width = int(len(single_nodes) ** 0.5) or 1
+    for i, node in enumerate(single_nodes):
+        row, col = divmod(i, grid_width)
+        positions[node] = {"x": dag_x_offset + col * single_node_spacing, "y": row * single_node_spacing}
+    return positions
+
+
+def _random_dag_forest(n=400, p=0.004, seed=0):
+    rng = np.random.default_rng(seed)
+    G = nx.DiGraph()
+    G.add_nodes_from(f"tasks/{i}" for i in rng.permutation(n))
+    nodes = sorted(G, key=lambda node: int(node.split("/")[1]))
+    for u in range(n):
+        for v in np.flatnonzero(rng.random(n - u - 1) < p) + u + 1:
+            G.add_edge(nodes[u], nodes[v])
+    return G
+
+
+def _layers(positions):
+    """x coordinates of every row of the layout. Nodes of a layer may come in any order."""
+    layers = defaultdict(list)
+    for position in positions.values():
+        layers[position["y"]].append(position["x"])
+    return {y: sorted(xs) for y, xs in layers.items()}
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_layered_positions_match_baseline(seed):
+    G = _random_dag_forest(seed=seed)
+    positions = layered_dag_positions(G)
+    expected = _baseline_positions(G)
+
+    assert positions.keys() == expected.keys()
+    assert {node: p["y"] for node, p in positions.items() if G.degree(node)} == \
+        {node: p["y"] for node, p in expected.items() if G.degree(node)}
+    assert _layers(positions) == _layers(expected)
+    # Single nodes are laid out in the same grid
+    assert {node: p for node, p in positions.items() if not G.degree(node)} == \
+        {node: p for node, p in expected.items() if not G.degree(node)}
+
+
+def test_cycles_go_below_their_component():
+    G = nx.DiGraph([("a", "b"), ("b", "c"), ("c", "d"), ("d", "c"), ("x", "y")])
+    G.add_node("single")
+    positions = layered_dag_positions(G)
+
+    assert [positions[node]["y"] for node in "abcd"] == [0, -100, -200, -200]
+    assert positions["x"]["y"] == 0 and positions["y"]["y"] == -100
+    # The second component starts after the first one, the single node after both
+    assert positions["x"]["x"] > positions["a"]["x"]
+    assert positions["single"]["x"] > positions["x"]["x"]
+
+
+def test_empty_graph():
+    assert layered_dag_positions(nx.DiGraph()) == {}
@@ -0,0 +1,92 @@
+from graph_lod import GROUP_PREFIX, _collapse, group_by_component, group_by_team_seniority, level_of_detail
+
+
+def _node(node_id, **data):
+    return {"data": {"id": node_id, "label": "employee", "name": node_id, **data}}
+
+
+def _edge(source, target, label="interacts with"):
+    return {"data": {"id": f"{source}-{target}", "label": label, "source": source, "target": target}}
+
+
+ELEMENTS = {
+    "nodes": [
+        _node("a1", Team="A", Seniority="Senior"),
+        _node("a2", Team="A", Seniority="Senior"),
+        _node("a3", Team="A", Seniority="Senior"),
+        _node("b1", Team="B", Seniority="Junior"),
+        _node("b2", Team="B", Seniority="Junior"),
+        _node("c1", Team="C", Seniority="Lead"),
+    ],
+    "edges": [
+        _edge("a1", "a2"),
+        _edge("a2", "a3"),
+        _edge("a1", "b1"),
+        _edge("a2", "b2"),
+        _edge("b1", "c1"),
+        _edge("c1", "a3"),
+        _edge("a1", "gone"),
+    ],
+}
+GROUPS = {"a1": "A", "a2": "A", "a3": "A", "b1": "B", "b2": "B", "c1": "C"}
+
+
+def _by_id(items):
+    return {item["data"]["id"]: item["data"] for item in items}
+
+
+def test_collapse_groups_nodes_and_counts_edges():
+    collapsed = _collapse(ELEMENTS, GROUPS, frozenset())
+    nodes, edges = _by_id(collapsed["nodes"]), _by_id(collapsed["edges"])
+
+    # Groups of one node stay as they are
+    assert set(nodes) == {f"{GROUP_PREFIX}A", f"{GROUP_PREFIX}B", "c1"}
+    assert nodes[f"{GROUP_PREFIX}A"]["size"] == 3
+    assert nodes[f"{GROUP_PREFIX}A"]["internal_edges"] == 2
+    assert "internal_edges" not in nodes[f"{GROUP_PREFIX}B"]
+
+    counts = {(edge["source"], edge["target"]): edge.get("count") for edge in edges.values()}
+    assert counts == {
+        (f"{GROUP_PREFIX}A", f"{GROUP_PREFIX}B"): 2,
+        (f"{GROUP_PREFIX}B", "c1"): 1,
+        ("c1", f"{GROUP_PREFIX}A"): 1,
+    }
+
+
+def test_expanded_group_shows_its_nodes():
+    collapsed = _collapse(ELEMENTS, GROUPS, frozenset({"A"}))
+    nodes, edges = _by_id(collapsed["nodes"]), _by_id(collapsed["edges"])
+
+    assert set(nodes) == {"a1", "a2", "a3", f"{GROUP_PREFIX}B", "c1"}
+    # Edges between shown nodes are kept as they are
+    assert {"a1-a2", "a2-a3", "c1-a3"} <= set(edges)
+    assert edges[f"a1->{GROUP_PREFIX}B/interacts with"]["count"] == 1
+    assert edges[f"a2->{GROUP_PREFIX}B/interacts with"]["count"] == 1
+
+
+def test_collapse_does_not_modify_its_input():
+    nodes_before = [dict(node["data"]) for node in ELEMENTS["nodes"]]
+    _collapse(ELEMENTS, GROUPS, frozenset())
+    assert [node["data"] for node in ELEMENTS["nodes"]] == nodes_before
+
+
+def test_level_of_detail_budget():
+    assert level_of_detail(ELEMENTS, group_by_team_seniority, budget=100) == (ELEMENTS, False)
+
+    collapsed, is_collapsed = level_of_detail(ELEMENTS, group_by_team_seniority, budget=5)
+    assert is_collapsed
+    assert f"{GROUP_PREFIX}A · Senior" in _by_id(collapsed["nodes"])
+
+
+def test_group_by_component():
+    elements = {
+        "nodes": [_node(node_id) for node_id in ["t1", "t2", "t3", "t4", "t5"]],
+        "edges": [_edge("t1", "t2", "depends on"), _edge("t3", "t2", "depends on")],
+    }
+    assert group_by_component(elements) == {
+        "t1": "Component of t1",
+        "t2": "Component of t1",
+        "t3": "Component of t1",
+        "t4": "Unconnected",
+        "t5": "Unconnected",
+    }
@@ -0,0 +1,50 @@
+import datetime
+
+import networkx as nx
+
+from graph_snapshot import load_snapshot, save_snapshot
+
+
+def _round_trip(G, tmp_path):
+    save_snapshot(G, G.name, ("rev", 1), directory=tmp_path)
+    return load_snapshot(G.name, ("rev", 1), directory=tmp_path)
+
+
+def _assert_same_graph(G, H):
+    assert H.is_directed() == G.is_directed()
+    assert dict(H.nodes(data=True)) == dict(G.nodes(data=True))
+    assert sorted(H.edges(data=True), key=repr) == sorted(G.edges(data=True), key=repr)
+    # Equal is not enough, 1 == 1.0 == True
+    assert repr(sorted(H.nodes(data=True), key=repr)) == repr(sorted(G.nodes(data=True), key=repr))
+    assert repr(sorted(H.edges(data=True), key=repr)) == repr(sorted(G.edges(data=True), key=repr))
+
+
+def test_round_trip_keeps_every_attribute(tmp_path):
+    G = nx.DiGraph(name="tasks")
+    G.add_node("tasks/1", StoryPoints=3, Status="Completed", ActualFinishTime=None)
+    G.add_node("tasks/2", StoryPoints=2.5, Status="Planned", ActualFinishTime=None, Flagged=True)
+    G.add_node("tasks/3", StoryPoints=5, Meta={"owner": "a", "tags": ["x", 1]})
+    G.add_node("tasks/4", Meta={"reviewer": "b"}, Window=(1, 2), Due=datetime.date(2025, 1, 31))
+    G.add_edge("tasks/1", "tasks/2", weight=1, label="depends on")
+    G.add_edge("tasks/2", "tasks/3", weight=0.5)
+    G.add_edge("tasks/3", "tasks/4", note=None)
+    G.add_edge("tasks/4", "tasks/1")
+
+    _assert_same_graph(G, _round_trip(G, tmp_path))
+
+
+def test_round_trip_mixed_node_ids_and_undirected(tmp_path):
+    G = nx.Graph(name="mixed")
+    G.add_edges_from([(1, "a"), ("a", (2, 3)), (4, 5)], count=2)
+    G.add_node(6)
+
+    _assert_same_graph(G, _round_trip(G, tmp_path))
+
+
+def test_stale_revision_is_ignored(tmp_path):
+    G = nx.path_graph(3)
+    G.name = "path"
+    save_snapshot(G, G.name, 1, directory=tmp_path)
+
+    assert load_snapshot(G.name, 2, directory=tmp_path) is None
+    _assert_same_graph(G, load_snapshot(G.name, 1, directory=tmp_path))